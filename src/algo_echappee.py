@@ -45,7 +45,7 @@ Sorties :
 - traded_tickers : set - Tickers déjà tradés (pour éviter les doublons)
 - escape_start_times : dict - Timestamp du début d'échappée par ticker
 - top_n_start_times : dict - Timestamp d'entrée dans le top N par ticker
-- trades_today : dict - Compteur de trades par jour (format: 'YYYY-MM-DD': count)
+- trades_today : tuple - Compteur de trades du jour courant ('YYYY-MM-DD', count)
 - last_trade_time : timestamp du dernier trade ouvert
 
 ==== PARAMÈTRES DE LA STRATÉGIE ====
@@ -63,8 +63,12 @@ Sorties :
 - trade_start_hour : Heure de début de trading (ex: "09:30")
 """
 
+# Décalage appliqué à l'heure locale pour obtenir l'heure de marché
+MARKET_OFFSET = timedelta(hours=-6)
+
+
 def fmt(ts):
-    return (datetime.fromtimestamp(ts) + timedelta(hours=-6)).strftime("%Y-%m-%d %H:%M:%S")
+    return (datetime.fromtimestamp(ts) + MARKET_OFFSET).strftime("%Y-%m-%d %H:%M:%S")
 
 class AlgoEchappee:
     def __init__(self, take_profit_market_pnl=50.0, min_escape_time=300,
@@ -89,21 +93,50 @@ class AlgoEchappee:
         self.max_trades_per_day = max_trades_per_day
         self.trade_cutoff_hour = trade_cutoff_hour
         self.trade_start_hour = trade_start_hour
+        # Fenêtre horaire convertie une seule fois en heures décimales
+        self._cutoff_hour = self._parse_time(trade_cutoff_hour)
+        self._start_hour = self._parse_time(trade_start_hour)
         self.max_trade_duration_minutes = max_trade_duration_minutes
+        # Durées converties une seule fois en secondes (comparées aux timestamps à chaque tick)
+        self._max_pnl_timeout_seconds = max_pnl_timeout_minutes * 60
+        self._max_duration_seconds = max_trade_duration_minutes * 60
+        self._interval_seconds = trade_interval_minutes * 60
         self.verbose = verbose
         self.escape_start_times = {}
         self.top_n_start_times = {}
         self.last_trade_time = None
-        self.trades_today = {}  # Suivi des trades par jour (format: 'YYYY-MM-DD': count)
+        self.trades_today = (None, 0)  # Trades du jour courant (format: ('YYYY-MM-DD', count))
+        # timestamp → (date, heure décimale) : main interroge plusieurs fois les mêmes timestamps
+        self._market_times = {}
+
+    def _market_time(self, timestamp):
+        """(date 'YYYY-MM-DD', heure décimale) de marché d'un timestamp, mémorisées."""
+        cached = self._market_times.get(timestamp)
+        if cached is None:
+            if len(self._market_times) >= 64:
+                self._market_times.clear()
+            dt = datetime.fromtimestamp(timestamp) + MARKET_OFFSET
+            cached = self._market_times[timestamp] = (dt.strftime("%Y-%m-%d"), dt.hour + dt.minute / 60.0)
+        return cached
 
     def _get_date(self, timestamp):
         """Retourne la date au format 'YYYY-MM-DD' à partir d'un timestamp."""
-        return (datetime.fromtimestamp(timestamp) + timedelta(hours=-6)).strftime("%Y-%m-%d")
+        return self._market_time(timestamp)[0]
 
     def _get_hour(self, timestamp):
         """Retourne l'heure (en heures décimales) à partir d'un timestamp."""
-        dt = datetime.fromtimestamp(timestamp) + timedelta(hours=-6)
-        return dt.hour + dt.minute / 60.0
+        return self._market_time(timestamp)[1]
+
+    def _trades_count(self, current_date):
+        """Nombre de trades ouverts le jour current_date (0 pour un nouveau jour)."""
+        day, count = self.trades_today
+        return count if day == current_date else 0
+
+    def _count_trade(self, current_date):
+        """Compte un trade ouvert le jour current_date ; retourne le total du jour."""
+        count = self._trades_count(current_date) + 1
+        self.trades_today = (current_date, count)
+        return count
 
     def _parse_time(self, time_str):
         """Convertit une chaîne HH:MM en heures décimales."""
@@ -114,8 +147,8 @@ class AlgoEchappee:
         """Vérifie si un nouveau trade peut être ouvert (limite par jour et fenêtre horaire)."""
         current_date = self._get_date(timestamp)
         current_hour = self._get_hour(timestamp)
-        cutoff_hour = self._parse_time(self.trade_cutoff_hour)
-        start_hour = self._parse_time(self.trade_start_hour)
+        cutoff_hour = self._cutoff_hour
+        start_hour = self._start_hour
 
         # Vérifier la fenêtre horaire
         if not (start_hour <= current_hour < cutoff_hour):
@@ -123,31 +156,55 @@ class AlgoEchappee:
             return False
 
         # Vérifier le nombre maximum de trades par jour
-        trades_count = self.trades_today.get(current_date, 0)
+        trades_count = self._trades_count(current_date)
         if trades_count >= self.max_trades_per_day:
             # print(f"Trade blocked at {fmt(timestamp)}: Max trades per day ({self.max_trades_per_day}) reached for {current_date}")
             return False
 
         return True
 
-    def calculate_echappees(self, table, current_timestamp):
-        """Calcule les tickers en échappée basés sur les market_pnl des 15 premiers tickers."""
-        top_15 = table.get_top_n(15)
-        tickers_data = [
-            {
-                'Ticker': ticker,
-                'market_pnl': entry.get_pnl(),
-                'market_pnl_max': entry.global_max_pnl
-            }
-            for ticker, entry in top_15
-        ]
-
-        if not tickers_data:
+    def is_idle_until(self, timestamp, end_timestamp):
+        """
+        True si plus rien ne peut changer le PnL d'ici end_timestamp (ticks triés par temps) :
+        aucune position ouverte et plus aucun trade ne peut s'ouvrir ce jour-là
+        (fenêtre horaire dépassée ou nombre max de trades du jour atteint).
+        """
+        if self.portfolio.open_by_ticker:
+            return False
+        current_date = self._get_date(timestamp)
+        if self._get_date(end_timestamp) != current_date:
+            return False
+        if self._get_hour(timestamp) >= self._cutoff_hour:
+            return True
+        return self._trades_count(current_date) >= self.max_trades_per_day
+
+    def _top_pnl_stats(self, top_15):
+        """
+        PnL des tickers du top 15 (dans l'ordre), leur moyenne et leur écart-type
+        (nul sous 3 tickers). np.mean / np.std gardés tels quels : une autre formule
+        changerait les arrondis, donc les seuils d'échappée.
+        """
+        market_pnls = [entry.get_pnl() for _, entry in top_15]
+        if not market_pnls:
+            return market_pnls, 0.0, 0.0
+        pnls = np.array(market_pnls)
+        std_pnl = np.std(pnls) if len(pnls) > 2 else 0.0
+        return market_pnls, np.mean(pnls), std_pnl
+
+    def calculate_echappees(self, table, current_timestamp, top_15=None, stats=None):
+        """
+        Calcule les tickers en échappée basés sur les market_pnl des 15 premiers tickers.
+        top_15 : table.get_top_n(15) déjà obtenu par l'appelant (table inchangée depuis).
+        stats : _top_pnl_stats(top_15) déjà calculé par l'appelant.
+        """
+        if top_15 is None:
+            top_15 = table.get_top_n(15)
+        if not top_15:
             return []
 
-        pnls = np.array([ticker_data['market_pnl'] for ticker_data in tickers_data])
-        mean_pnl = np.mean(pnls)
-        std_pnl = np.std(pnls) if len(pnls) > 2 else 0
+        if stats is None:
+            stats = self._top_pnl_stats(top_15)
+        market_pnls, mean_pnl, std_pnl = stats
 
         if std_pnl < 5:
             return []
@@ -155,11 +212,7 @@ class AlgoEchappee:
         seuil_echappee = mean_pnl + self.start_echappee_threshold * std_pnl
 
         echappees = []
-        for i, ticker_data in enumerate(tickers_data):
-            ticker = ticker_data['Ticker']
-            market_pnl = ticker_data['market_pnl']
-            market_pnl_max = ticker_data['market_pnl_max']
-
+        for i, ((ticker, _), market_pnl) in enumerate(zip(top_15, market_pnls)):
             # Check if ticker is in top N
             is_in_top_n = i < self.top_n_threshold
             if is_in_top_n:
@@ -184,25 +237,23 @@ class AlgoEchappee:
 
     def main(self, table, timestamp):
         """Exécute la stratégie d'échappée."""
-        # Iterate over tickers with open positions using get_open_tickers
+        # Trades ouverts par ticker, tenus à jour par le portefeuille
+        open_by_ticker = self.portfolio.open_by_ticker
+
+        # Iterate over tickers with open positions using get_open_tickers (liste triée : l'index bouge pendant la boucle)
         for ticker in self.portfolio.get_open_tickers():
-            last_price = table.get_last_price(ticker)
+            # Entrée de la table lue une fois (absente : pas de prix, rien à faire)
+            entry = table.ticker_map.get(ticker)
+            if entry is None:
+                continue
+            # Un tick invalide peut laisser last_price à None (cf. TickerEntry.update)
+            last_price = entry.last_price
             if last_price is None:
                 continue
 
-            market_pnl = table.ticker_map[ticker].get_pnl() if ticker in table.ticker_map else 0.0
-            market_pnl_max = table.ticker_map[ticker].global_max_pnl if ticker in table.ticker_map else 0.0
-            global_max_time = table.ticker_map[ticker].global_max_time if ticker in table.ticker_map else timestamp
-
-            # Aggregate unrealized PNL for the ticker
-            unrealized_pnl = sum(
-                trade["unrealized_pnl"] for trade in self.portfolio.trades
-                if trade["ticker"] == ticker and trade["status"] == "open"
-            )
-            unrealized_pnl_max = sum(
-                trade["unrealized_pnl_max"] for trade in self.portfolio.trades
-                if trade["ticker"] == ticker and trade["status"] == "open"
-            )
+            market_pnl = entry.get_pnl()
+            market_pnl_max = entry.global_max_pnl
+            global_max_time = entry.global_max_time
 
             # Check take-profit conditions
             if market_pnl >= self.take_profit_market_pnl:
@@ -215,58 +266,56 @@ class AlgoEchappee:
                 continue
 
             # Vérifier si le global_max_pnl n'a pas été dépassé depuis max_pnl_timeout_minutes
-            max_pnl_timeout_seconds = self.max_pnl_timeout_minutes * 60
-            if (timestamp - global_max_time) >= max_pnl_timeout_seconds:
+            if (timestamp - global_max_time) >= self._max_pnl_timeout_seconds:
                 self.portfolio.close_position(ticker, last_price, timestamp, table)
-                print(f"Closed position on {ticker} at {fmt(timestamp)} due to max PNL timeout (no new max PNL for {self.max_pnl_timeout_minutes} minutes)")
+                if self.verbose:
+                    print(f"Closed position on {ticker} at {fmt(timestamp)} due to max PNL timeout (no new max PNL for {self.max_pnl_timeout_minutes} minutes)")
                 continue
 
             # Vérifier si la durée max du trade est dépassée
-            max_duration_seconds = self.max_trade_duration_minutes * 60
-            for trade in self.portfolio.trades:
-                if trade["ticker"] == ticker and trade["status"] == "open":
-                    if (timestamp - trade["entry_time"]) >= max_duration_seconds:
-                        self.portfolio.close_position(ticker, last_price, timestamp, table)
-                        if self.verbose:
-                            print(f"Closed position on {ticker} at {fmt(timestamp)} due to max duration ({self.max_trade_duration_minutes} min)")
-                        break
+            for trade in open_by_ticker[ticker]:
+                if (timestamp - trade["entry_time"]) >= self._max_duration_seconds:
+                    self.portfolio.close_position(ticker, last_price, timestamp, table)
+                    if self.verbose:
+                        print(f"Closed position on {ticker} at {fmt(timestamp)} due to max duration ({self.max_trade_duration_minutes} min)")
+                    break
 
         # Close Trade: Calculate echappees and check stop echappee
+        # Top 15 et ses statistiques calculés une fois, réutilisés pour l'ouverture
         top_15 = table.get_top_n(15)
-        tickers_data = {ticker: entry.get_pnl() for ticker, entry in top_15}
-        mean_pnl = np.mean(list(tickers_data.values())) if tickers_data else 0.0
-        std_pnl = np.std(list(tickers_data.values())) if len(tickers_data) > 2 else 0.0
+        stats = self._top_pnl_stats(top_15)
+        _, mean_pnl, std_pnl = stats
         seuil_echappee = mean_pnl - std_pnl * self.stop_echappee_threshold
 
         for ticker in self.portfolio.get_open_tickers():
-            market_pnl = table.ticker_map[ticker].get_pnl() if ticker in table.ticker_map else 0.0
-            if market_pnl <= seuil_echappee:
-                last_price = table.get_last_price(ticker)
-                if last_price is not None:
-                    self.portfolio.close_position(ticker, last_price, timestamp, table)
+            entry = table.ticker_map.get(ticker)
+            if entry is not None and entry.last_price is not None and entry.get_pnl() <= seuil_echappee:
+                self.portfolio.close_position(ticker, entry.last_price, timestamp, table)
 
-        # Open new trades based on echappees
+        # Open new trades based on echappees (fenêtre horaire et limite du jour testées
+        # avant tout calcul d'échappée)
         if self._can_open_trade(timestamp):
-            echappees = self.calculate_echappees(table, timestamp)
+            echappees = self.calculate_echappees(table, timestamp, top_15, stats)
             for ticker in echappees:
-                if ticker not in self.traded_tickers and not self.portfolio.is_ticker_in_portfolio(ticker):
-                    last_price = table.get_last_price(ticker)
+                # Tout ticker ouvert par la stratégie est dans traded_tickers (jamais vidé) :
+                # ce seul test couvre aussi les positions en cours
+                if ticker not in self.traded_tickers:
+                    entry = table.ticker_map.get(ticker)
+                    last_price = entry.last_price if entry is not None else None
                     if last_price is not None and last_price > 0:
-                        market_pnl = table.ticker_map[ticker].get_pnl() if ticker in table.ticker_map else 0.0
+                        market_pnl = entry.get_pnl()
                         quantity = int(self.trade_value_eur / last_price)
                         if market_pnl > self.min_market_pnl and quantity > 0:
                             success = self.portfolio.open_trade(ticker, quantity, table, timestamp)
                             if success:
                                 self.traded_tickers.add(ticker)
                                 self.last_trade_time = timestamp
-                                current_date = self._get_date(timestamp)
-                                self.trades_today[current_date] = self.trades_today.get(current_date, 0) + 1
+                                trades_count = self._count_trade(self._get_date(timestamp))
                                 if self.verbose:
-                                    print(f"Opened echappee trade on {ticker} for {quantity} shares at {fmt(timestamp)} (Trades today: {self.trades_today[current_date]}/{self.max_trades_per_day})")
+                                    print(f"Opened echappee trade on {ticker} for {quantity} shares at {fmt(timestamp)} (Trades today: {trades_count}/{self.max_trades_per_day})")
 
         # Periodic trade opening based on trade_interval_minutes
-        interval_seconds = self.trade_interval_minutes * 60
-        if self.last_trade_time is None or (timestamp - self.last_trade_time) >= interval_seconds:
+        if self.last_trade_time is None or (timestamp - self.last_trade_time) >= self._interval_seconds:
             if self._can_open_trade(timestamp):
                 best_ticker = self.portfolio.get_open_trade_best_pnl(table)
                 if best_ticker:
@@ -278,9 +327,9 @@ class AlgoEchappee:
                             if success:
                                 self.traded_tickers.add(best_ticker)
                                 self.last_trade_time = timestamp
-                                current_date = self._get_date(timestamp)
-                                self.trades_today[current_date] = self.trades_today.get(current_date, 0) + 1
-                                print(f"Opened periodic trade on {best_ticker} for {quantity} shares at {fmt(timestamp)} (interval: {self.trade_interval_minutes} min, Trades today: {self.trades_today[current_date]}/{self.max_trades_per_day})")
+                                trades_count = self._count_trade(self._get_date(timestamp))
+                                if self.verbose:
+                                    print(f"Opened periodic trade on {best_ticker} for {quantity} shares at {fmt(timestamp)} (interval: {self.trade_interval_minutes} min, Trades today: {trades_count}/{self.max_trades_per_day})")
 
     def close_all(self, table, timestamp):
         """Ferme toutes les positions."""
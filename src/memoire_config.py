@@ -10,6 +10,7 @@
 
 # Générer ensuite tous les commentaires sans le code, avec  chaque phrase répétée 3 fois pour tts reader
 
+import atexit
 import json
 import os
 
@@ -20,24 +21,33 @@ class SimulationMemoire:
     afin d'éviter de recalculer des tests déjà effectués.
     """
 
+    # Nombre de résultats ajoutés entre deux réécritures du fichier
+    FLUSH_EVERY = 50
+
     def __init__(self, filename="memoire_config.json"):
         """
         Constructeur.
         - filename : nom du fichier JSON où les résultats sont sauvegardés.
         - memoire : dictionnaire contenant les résultats en mémoire vive pendant l'exécution.
+        Les résultats non encore écrits le sont à la sortie du programme (cf. flush).
         """
         self.filename = filename
         self.memoire = self._load()
+        self._dirty = False
+        self._writes_since_flush = 0
+        atexit.register(self.flush)
 
     def _load(self):
         """
         Charge le contenu du fichier JSON si il existe, sinon renvoie un dictionnaire vide.
         Utilise le module json pour lire les données et le module os pour vérifier l'existence du fichier.
+        Les clés du fichier (JSON triés) sont converties une fois en clés tuple (cf. _make_key).
         """
         if os.path.exists(self.filename):
             try:
                 with open(self.filename, 'r') as f:
-                    return json.load(f)
+                    stored = json.load(f)
+                return {self._make_key(json.loads(key)): metrics for key, metrics in stored.items()}
             except Exception:
                 return {}
         return {}
@@ -46,9 +56,24 @@ class SimulationMemoire:
         """
         Sauvegarde le contenu actuel de self.memoire dans le fichier JSON.
         Écrit avec une indentation pour faciliter la lecture humaine.
+        Les clés tuple redeviennent des JSON triés : même format de fichier qu'avant.
+        Écriture atomique (fichier temporaire puis remplacement) : un arrêt brutal
+        ne laisse jamais un fichier à moitié écrit.
+        """
+        stored = {json.dumps(dict(key), sort_keys=True): metrics for key, metrics in self.memoire.items()}
+        tmp = self.filename + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(stored, f, indent=4)
+        os.replace(tmp, self.filename)
+        self._dirty = False
+        self._writes_since_flush = 0
+
+    def flush(self):
+        """
+        Sauvegarde la mémoire seulement si des résultats n'ont pas encore été écrits.
         """
-        with open(self.filename, 'w') as f:
-            json.dump(self.memoire, f, indent=4)
+        if self._dirty:
+            self.save()
 
     def has_been_tested(self, params):
         """
@@ -58,6 +83,13 @@ class SimulationMemoire:
         key = self._make_key(params)
         return key in self.memoire
 
+    def get(self, params):
+        """
+        Récupère les métriques d'un ensemble de paramètres, ou None s'il n'a pas été testé.
+        Remplace has_been_tested suivi de get_pnl : une seule clé calculée, une seule recherche.
+        """
+        return self.memoire.get(self._make_key(params))
+
     def get_pnl(self, params):
         """
         Récupère les métriques associées à un ensemble de paramètres.
@@ -76,7 +108,8 @@ class SimulationMemoire:
     def add_result(self, params, metrics):
         """
         Ajoute ou met à jour les métriques pour un ensemble de paramètres.
-        Puis sauvegarde immédiatement la mémoire mise à jour dans le fichier JSON.
+        Le fichier JSON n'est réécrit que tous les FLUSH_EVERY résultats (et à la sortie) :
+        le réécrire en entier à chaque ajout dominait le temps d'un balayage de paramètres.
         """
         key = self._make_key(params)
         self.memoire[key] = {
@@ -87,14 +120,19 @@ class SimulationMemoire:
             'positive_or_zero_pnl_days': metrics['positive_or_zero_pnl_days'],
             'negative_pnl_days': metrics['negative_pnl_days']
         }
-        self.save()
+        self._dirty = True
+        self._writes_since_flush += 1
+        if self._writes_since_flush >= self.FLUSH_EVERY:
+            self.save()
 
-    def _make_key(self, params):
+    @staticmethod
+    def _make_key(params):
         """
-        Transforme les paramètres en une chaîne JSON triée pour servir de clé unique.
-        Cela garantit que l'ordre des paramètres n'affecte pas la reconnaissance.
+        Transforme les paramètres en un tuple de paires (nom, valeur) triées pour servir de clé unique.
+        Cela garantit que l'ordre des paramètres n'affecte pas la reconnaissance,
+        et se hache bien plus vite qu'une chaîne JSON à chaque consultation.
         """
-        return json.dumps(params, sort_keys=True)
+        return tuple(sorted(params.items()))
 
 
 
@@ -6,62 +6,241 @@ MultiFileSimulator — VERSION AVEC nb_trades, roi, win_rate, drawdown
 """
 
 import os
-import json
-import lz4.frame
-import pandas as pd
+import sys
+import atexit
+import functools
+import itertools
+import multiprocessing
+import numpy as np
 from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from price_logger import PriceLogger, PriceColumns
 from single_file_simulator import SingleFileSimulator
 
 
+def load_prices(data_files):
+    """
+    Décompresse une seule fois chaque fichier .lz4.
+    Retourne {chemin: PriceColumns} (les fichiers absents sont ignorés).
+    Le résultat est partagé dans le processus : deux optimiseurs (ou simulateurs)
+    sur les mêmes fichiers ne décompressent les données qu'une fois. Ne pas le modifier.
+    """
+    return _load_prices_cached(tuple(data_files))
+
+
+@functools.lru_cache(maxsize=1)
+def _load_prices_cached(data_files):
+    prices = {}
+    for filename in data_files:
+        columns = PriceLogger(filename).read_columns(cache=True)
+        if columns is not None:
+            prices[filename] = columns
+    return prices
+
+
+def _simulate_single_file(filename, config, ticks=None):
+    """
+    Simulation réelle : appelle SingleFileSimulator.run_single_file
+    """
+    try:
+        result = SingleFileSimulator.run_single_file(filename, config, verbose=False, ticks=ticks)
+        return result  # contient file_pnl, num_traded, etc.
+    except Exception:
+        return {
+            "file_pnl": 0.0,
+            "num_traded": 0
+        }
+
+
+def _simulate_file_batch(filename, configs, ticks=None):
+    """
+    Simule plusieurs configs sur un même fichier, décompressé une seule fois
+    et parcouru une seule fois (table des PnL partagée entre les configs).
+    """
+    if ticks is None:
+        try:
+            ticks = PriceLogger(filename).read_columns()
+        except Exception:
+            ticks = None  # la simulation relira le fichier et renverra des résultats vides
+    try:
+        return SingleFileSimulator.run_single_file_batch(filename, configs, verbose=False, ticks=ticks)
+    except Exception:
+        return [{"file_pnl": 0.0, "num_traded": 0} for _ in configs]
+
+
+def pool_context():
+    """
+    Contexte multiprocessing des pools de simulation. Sous Linux, fork explicite
+    (et non la méthode par défaut, qui peut changer d'une version de Python à l'autre) :
+    les workers héritent en copie sur écriture des ticks préchargés, rien n'est sérialisé.
+    Ailleurs (macOS, Windows), méthode par défaut : les ticks passent alors par la
+    mémoire partagée (cf. MultiFileSimulator._pool).
+    """
+    if sys.platform.startswith("linux"):
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def cpu_count():
+    """
+    Nombre de workers des pools de simulation : CPU réellement attribués au processus
+    (taskset, cgroups), alors que os.cpu_count() compte toute la machine.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# ================================================================
+# MÉMOIRE PARTAGÉE — colonnes numpy des ticks vues par les workers sans copie
+# ================================================================
+_COLUMN_FIELDS = ("timestamps", "codes", "prices")
+
+
+def _share_columns(columns, segments):
+    """
+    Copie les colonnes numériques d'un PriceColumns dans des segments SharedMemory
+    (ajoutés à segments) et retourne la poignée légère à envoyer aux workers.
+    Les colonnes object (cas rare) voyagent telles quelles.
+    """
+    handle = {"tickers": columns.tickers}
+    for field in _COLUMN_FIELDS:
+        array = getattr(columns, field)
+        if array.dtype == object or array.nbytes == 0:
+            handle[field] = array
+            continue
+        segment = shared_memory.SharedMemory(create=True, size=array.nbytes)
+        np.ndarray(array.shape, array.dtype, buffer=segment.buf)[:] = array
+        segments.append(segment)
+        handle[field] = (segment.name, array.shape, array.dtype.str)
+    return handle
+
+
+def _attach_columns(handle, segments):
+    """PriceColumns dont les colonnes sont des vues sur les segments partagés."""
+    fields = {}
+    for field in _COLUMN_FIELDS:
+        value = handle[field]
+        if isinstance(value, tuple):
+            name, shape, dtype = value
+            segment = shared_memory.SharedMemory(name=name)
+            # Le segment doit vivre aussi longtemps que la vue
+            segments.append(segment)
+            value = np.ndarray(shape, dtype, buffer=segment.buf)
+        fields[field] = value
+    return PriceColumns(fields["timestamps"], fields["codes"], handle["tickers"], fields["prices"])
+
+
+# ================================================================
+# WORKERS — seuls (fichier, config) voyagent, les ticks sont déjà dans le worker
+# ================================================================
+_WORKER_PRICES = {}
+_WORKER_SEGMENTS = []
+
+
+def _init_worker(data_files, shared=None):
+    # shared : poignées des colonnes en mémoire partagée (démarrage spawn après preload).
+    # Sinon décompression une fois par worker (gratuite en fork après preload : cache hérité)
+    global _WORKER_PRICES
+    if shared is not None:
+        _WORKER_PRICES = {f: _attach_columns(h, _WORKER_SEGMENTS) for f, h in shared.items()}
+    else:
+        _WORKER_PRICES = load_prices(data_files)
+
+
+def _worker_single_file(filename, config):
+    return _simulate_single_file(filename, config, _WORKER_PRICES.get(filename))
+
+
+def _worker_file_batch(filename, configs):
+    return _simulate_file_batch(filename, configs, _WORKER_PRICES.get(filename))
+
+
 class MultiFileSimulator:
 
     def __init__(self, data_files, parallel=True, verbose=False):
         self.data_files = data_files
         self.parallel = parallel
         self.verbose = verbose
+        self._loaded = None
+        # Pool de processus créé au premier run parallèle puis réutilisé (cf. close)
+        self._executor = None
+        self._workers = None
+        self._segments = []
 
 
-    def _simulate_single_file(self, filename, config):
+    def preload(self):
         """
-        Simulation réelle : appelle SingleFileSimulator.run_single_file
+        Décompresse une fois tous les fichiers : les runs suivants réutilisent
+        les colonnes en mémoire au lieu de relire les .lz4.
         """
-        try:
-            result = SingleFileSimulator.run_single_file(filename, config, verbose=False)
-            return result  # contient file_pnl, num_traded, etc.
-        except Exception:
-            return {
-                "file_pnl": 0.0,
-                "num_traded": 0
-            }
+        self._loaded = load_prices(self.data_files)
+        return self._loaded
+
 
+    def __getstate__(self):
+        # Les données préchargées (et le pool) ne voyagent pas avec chaque tâche envoyée aux workers
+        state = self.__dict__.copy()
+        state['_loaded'] = None
+        state['_executor'] = None
+        state['_segments'] = []
+        return state
 
-    def _compute_drawdown(self, daily_pnls):
+
+    def _pool(self):
         """
-        Drawdown global basé sur l'équity cumulée entre les jours.
+        Pool persistant : les workers ne sont lancés (et numpy/pandas importés)
+        qu'une fois pour tous les runs, au lieu d'un pool neuf par run.
+        Après preload(), hors fork (spawn : Windows, macOS), les ticks sont placés une fois
+        en mémoire partagée : les workers les lisent sans décompression ni copie.
+        En fork, les workers héritent déjà des colonnes préchargées.
         """
-        equity = []
-        total = 0
-        for pnl in daily_pnls:
-            total += pnl
-            equity.append(total)
+        if self._executor is None:
+            context = pool_context()
+            shared = None
+            if self._loaded is not None and context.get_start_method() != "fork":
+                shared = {f: _share_columns(c, self._segments) for f, c in self._loaded.items()}
+            self._workers = cpu_count()
+            self._executor = ProcessPoolExecutor(max_workers=self._workers, mp_context=context,
+                                                 initializer=_init_worker,
+                                                 initargs=(self.data_files, shared))
+            atexit.register(self.close)
+        return self._executor
 
-        if not equity:
-            return 0.0
 
-        peak = equity[0]
-        max_dd = 0
+    def _chunksize(self):
+        """
+        Fichiers envoyés par message aux workers : ~4 paquets par worker, assez pour
+        équilibrer les journées de durées inégales sans un aller-retour par fichier.
+        La config n'est sérialisée qu'une fois par paquet (mémo de pickle).
+        Les résultats restent dans l'ordre des fichiers (le drawdown en dépend).
+        Workers comptés à la création du pool (cf. _pool), appelé donc après lui.
+        """
+        return max(1, len(self.data_files) // (4 * self._workers))
 
-        for value in equity:
-            if value > peak:
-                peak = value
-            dd = peak - value
-            if dd > max_dd:
-                max_dd = dd
 
-        return max_dd
+    def close(self):
+        """Arrête le pool de workers s'il a été créé et libère la mémoire partagée."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            atexit.unregister(self.close)
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
 
 
-    def run_all_files(self, config):
+    def _simulate_single_file(self, filename, config, ticks=None):
+        return _simulate_single_file(filename, config, ticks)
+
+
+    def _simulate_file_batch(self, filename, configs, ticks=None):
+        return _simulate_file_batch(filename, configs, ticks)
+
+
+    def run_all_files(self, config, prices=None):
         """
         Retourne maintenant :
         {
@@ -71,38 +250,105 @@ class MultiFileSimulator:
             win_rate,
             drawdown
         }
+
+        prices : {chemin: ticks} déjà décompressés (cf. load_prices), par défaut
+        ceux de preload(). Les .lz4 ne sont alors ni relus ni décompressés.
+        En parallèle, les tâches ne transportent que (fichier, config) : chaque worker
+        a décompressé les fichiers une fois à son démarrage (cf. _init_worker).
         """
 
+        # Résultats consommés au fil de l'eau par _aggregate, sans liste intermédiaire
         if self.parallel:
-            with ProcessPoolExecutor() as executor:
-                results = list(executor.map(
-                    self._simulate_single_file,
-                    self.data_files,
-                    [config] * len(self.data_files)
-                ))
+            results = self._pool().map(
+                _worker_single_file,
+                self.data_files,
+                itertools.repeat(config),
+                chunksize=self._chunksize()
+            )
         else:
-            results = [
-                self._simulate_single_file(f, config)
-                for f in self.data_files
+            ticks = self._ticks_per_file(prices)
+            results = (
+                self._simulate_single_file(f, config, t)
+                for f, t in zip(self.data_files, ticks)
+            )
+
+        return self._aggregate(results)
+
+
+    def run_all_files_batch(self, configs, prices=None):
+        """
+        Comme run_all_files, pour une liste de configs : fichiers en boucle externe,
+        configs en boucle interne, chaque fichier n'est donc décompressé qu'une fois.
+        En parallèle, un worker traite toutes les configs d'un fichier.
+        Retourne une liste de résultats dans l'ordre de `configs`.
+        """
+        if self.parallel:
+            per_file = list(self._pool().map(
+                _worker_file_batch,
+                self.data_files,
+                itertools.repeat(configs),
+                chunksize=self._chunksize()
+            ))
+        else:
+            ticks = self._ticks_per_file(prices)
+            per_file = [
+                self._simulate_file_batch(f, configs, t)
+                for f, t in zip(self.data_files, ticks)
             ]
 
-        # Extraction des daily metrics
-        daily_pnls = [r["file_pnl"] for r in results]
-        daily_trades = [r["num_traded"] for r in results]
+        return [
+            self._aggregate([results[i] for results in per_file])
+            for i in range(len(configs))
+        ]
 
-        total_pnl = sum(daily_pnls)
-        total_trades = sum(daily_trades)
+
+    def _ticks_per_file(self, prices):
+        """Ticks déjà décompressés de chaque fichier (None : le fichier sera lu)."""
+        if prices is None:
+            prices = self._loaded
+        if prices is None:
+            return [None] * len(self.data_files)
+        return [prices.get(f) for f in self.data_files]
+
+
+    def _aggregate(self, results):
+        """
+        Agrège les résultats journaliers (un par fichier, dans l'ordre des fichiers).
+        Un seul passage sur `results` (itérable quelconque) : totaux, jours positifs
+        et drawdown de l'equity cumulée jour/jour sont tenus à jour ensemble.
+        """
+        total_pnl = 0
+        total_trades = 0
+        positive_days = 0
+        total_days = 0
+
+        # Drawdown global : plus forte baisse de l'equity depuis son plus haut (départ au 1er jour)
+        equity = 0
+        peak = None
+        max_dd = 0
+
+        for r in results:
+            pnl = r["file_pnl"]
+            total_pnl += pnl
+            total_trades += r["num_traded"]
+            total_days += 1
+            if pnl > 0:
+                positive_days += 1
+
+            equity += pnl
+            if peak is None or equity > peak:
+                peak = equity
+            dd = peak - equity
+            if dd > max_dd:
+                max_dd = dd
 
         # ROI défini comme demandé
         roi = (total_pnl / total_trades) if total_trades > 0 else 0.0
 
         # Win rate = % de journées positives
-        positive_days = sum(1 for pnl in daily_pnls if pnl > 0)
-        total_days = len(daily_pnls)
         win_rate = (positive_days / total_days * 100.0) if total_days > 0 else 0.0
 
-        # Drawdown global basé sur l'equity cumulée jour/jour
-        drawdown = self._compute_drawdown(daily_pnls)
+        drawdown = max_dd if total_days > 0 else 0.0
 
         return {
             "total_pnl": total_pnl,
@@ -247,7 +247,7 @@ class Optimizer:
             test_params[param_name] = value
             
             # Vérifier si cette configuration a déjà été testée
-            if self.simulation_runner.memoire.has_been_tested(test_params):
+            if self.simulation_runner.memoire.get(test_params) is not None:
                 print(f"Configuration avec {param_name} = {value} déjà testée, passage à l'étape suivante")
                 continue
                 
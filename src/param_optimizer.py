@@ -2,8 +2,32 @@ import json
 import csv
 import os
 import glob
-from datetime import datetime, timedelta
-from multi_file_simulator import MultiFileSimulator
+import math
+import heapq
+import functools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multi_file_simulator import MultiFileSimulator, cpu_count, load_prices, pool_context
+
+
+# ========== Workers du pool de configs ==========
+
+_SIM = None
+_PRICES = None
+
+
+def _init_worker(data_files, prices):
+    """Crée une fois par worker un simulateur séquentiel (le pool parallélise déjà les configs)."""
+    global _SIM, _PRICES
+    _SIM = MultiFileSimulator(data_files, parallel=False, verbose=False)
+    _PRICES = prices
+
+
+def _worker_run(config: dict) -> float:
+    """Simule une config complète (tous les fichiers) dans un worker et retourne son PnL."""
+    return _SIM.run_all_files(config, prices=_PRICES)['total_pnl']
 
 
 class ParamOptimizer:
@@ -19,11 +43,25 @@ class ParamOptimizer:
         
         # Initialisation du simulateur
         data_files = data_files or glob.glob('../data/prices_data/dataset3/**/*.lz4', recursive=True)
-        self.multi_file_simulator = MultiFileSimulator(data_files, parallel=parallel, verbose=False)
+        
+        # Décompression unique des .lz4 : chaque config ne coûte plus que la simulation
+        self._prices = load_prices(data_files)
+        
+        # Un seul niveau de parallélisme : le pool répartit des configs entières,
+        # chaque worker simule ses fichiers en séquentiel (pas de pools imbriqués)
+        self._pool = None
+        self.multi_file_simulator = None
+        self.workers = cpu_count() if parallel else 1
+        if parallel:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context(),
+                                             initializer=_init_worker, initargs=(data_files, self._prices))
+        else:
+            self.multi_file_simulator = MultiFileSimulator(data_files, parallel=False, verbose=False)
         
         self.params = {}
         self.param_order = []
         self.all_results = []
+        self._values_memo = {}
         
         # Nouvelle variable: meilleure config globale
         self.global_best_pnl = float('-inf')
@@ -31,14 +69,38 @@ class ParamOptimizer:
         
         # 🆕 Cache des configurations déjà testées
         self.config_cache = {}
+        # Configs déjà présentes dans results.csv + lignes en attente d'écriture
+        self._written_keys = set()
+        self._pending_rows = []
+        # En-tête déjà présent : lu une seule fois, pas à chaque écriture. Les lignes sont
+        # écrites sous ses colonnes (le fichier peut venir de param_optimizer_chat4)
+        self._fieldnames = self._read_header()
+        self._header_written = self._fieldnames is not None
         self._load_cache_from_csv()
 
     # ========== 🆕 Gestion du cache ==========
     
-    def _config_to_key(self, config: dict) -> str:
-        """Convertit une config en clé unique (JSON trié)."""
-        return json.dumps(config, sort_keys=True)
+    def _config_to_key(self, config: dict) -> tuple:
+        """Convertit une config en clé unique (tuple des paires (nom, valeur) triées)."""
+        return tuple(sorted(config.items()))
+    
+    def _neighbor_keys(self, config: dict, param_name: str, values: list) -> list:
+        """
+        Clés des configs obtenues en ne changeant que `param_name` dans `config`,
+        sans copier ni re-trier le dict pour chaque valeur.
+        """
+        base = self._config_to_key(config)
+        idx = next(i for i, (name, _) in enumerate(base) if name == param_name)
+        head, tail = base[:idx], base[idx + 1:]
+        return [head + ((param_name, value),) + tail for value in values]
     
+    def _read_header(self):
+        """Colonnes de l'en-tête de results.csv, ou None si le fichier est absent ou vide."""
+        if not os.path.exists(self.results_file):
+            return None
+        with open(self.results_file, newline="") as f:
+            return next(csv.reader(f), None)
+
     def _load_cache_from_csv(self):
         """Charge toutes les configurations déjà testées depuis results.csv."""
         if not os.path.exists(self.results_file):
@@ -46,35 +108,38 @@ class ParamOptimizer:
             return
         
         try:
-            with open(self.results_file, 'r') as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
-                
-                for row in rows:
-                    pnl = float(row.pop('pnl'))
-                    # Convertit les valeurs en types appropriés
-                    config = {}
-                    for key, value in row.items():
-                        try:
-                            # Essaie int d'abord
-                            config[key] = int(value)
-                        except ValueError:
-                            try:
-                                # Puis float
-                                config[key] = float(value)
-                            except ValueError:
-                                # Sinon garde en string
-                                config[key] = value
-                    
-                    config_key = self._config_to_key(config)
-                    self.config_cache[config_key] = pnl
-                    self.all_results.append((pnl, config))
+            # Parsing et typage des colonnes en C (int/float/str inférés par colonne,
+            # flottants relus à l'identique pour retrouver les mêmes clés)
+            try:
+                df = pd.read_csv(self.results_file, float_precision="round_trip")
+            except pd.errors.EmptyDataError:
+                df = pd.DataFrame(columns=["pnl"])
+            pnls = df.pop('pnl').astype(float).tolist()
+            names = list(df.columns)
+            # Noms triés une fois pour tout le fichier (mêmes clés que _config_to_key, sans tri par ligne)
+            key_names = sorted(names)
+            
+            # Construits à part puis assignés ensemble : un fichier lu à moitié
+            # ne laisse ni cache, ni clés écrites, ni historique partiels
+            config_cache = {}
+            written_keys = set()
+            all_results = []
             
+            # tolist() rend des types Python natifs (int, float, str)
+            for pnl, values in zip(pnls, zip(*(df[name].tolist() for name in names))):
+                config = dict(zip(names, values))
+                config_key = tuple((name, config[name]) for name in key_names)
+                config_cache[config_key] = pnl
+                written_keys.add(config_key)
+                all_results.append((pnl, config))
+            
+            self.config_cache = config_cache
+            self._written_keys = written_keys
+            self.all_results = all_results
             print(f"✅ Cache chargé: {len(self.config_cache)} configurations depuis {self.results_file}")
             
         except Exception as e:
             print(f"⚠️  Erreur lors du chargement du cache: {e}")
-            self.config_cache = {}
 
     # ========== Gestion des paramètres ==========
     
@@ -85,6 +150,7 @@ class ParamOptimizer:
     def load_params(self):
         with open(self.json_file) as f:
             self.params = json.load(f)
+        self._values_memo.clear()
         
         # Filtre les paramètres actifs et tri par priorité
         active_params = {k: v for k, v in self.params.items() 
@@ -126,8 +192,11 @@ class ParamOptimizer:
             "pnl": pnl,
             "config": config
         }
-        with open(self.best_config_file, "w") as f:
-            json.dump(data, f, indent=4)
+        # Écriture atomique : un arrêt brutal ne laisse jamais un fichier tronqué
+        tmp = self.best_config_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp, self.best_config_file)
         print(f"  💾 Nouvelle meilleure config sauvegardée: PnL={pnl:.2f}")
 
     # ========== Génération des valeurs ==========
@@ -140,11 +209,12 @@ class ParamOptimizer:
         is_time = isinstance(settings["initial_value"], str) and ":" in settings["initial_value"]
         
         if is_time:
-            initial = datetime.strptime(str(settings["initial_value"]), "%H:%M")
-            min_val = datetime.strptime(settings["min_value"], "%H:%M")
-            max_val = datetime.strptime(settings["max_value"], "%H:%M")
-            step = timedelta(minutes=int(settings["step"]))
-            fmt = lambda x: x.strftime("%H:%M")
+            # Minutes depuis minuit : arithmétique entière, "HH:MM" seulement en sortie
+            initial = self._time_to_minutes(str(settings["initial_value"]))
+            min_val = self._time_to_minutes(settings["min_value"])
+            max_val = self._time_to_minutes(settings["max_value"])
+            step = int(settings["step"])
+            fmt = self._minutes_to_time
         else:
             initial = float(settings["initial_value"])
             min_val = float(settings["min_value"])
@@ -183,15 +253,25 @@ class ParamOptimizer:
         if max_tests == 1 and not expand_search:
             return [current_value]
         
+        # Même centre → mêmes valeurs : mémorisé jusqu'au prochain load_params()
+        memo_key = (param_name, current_value, max_tests, expand_search)
+        if memo_key not in self._values_memo:
+            self._values_memo[memo_key] = self._compute_values_around(
+                param_name, current_value, max_tests, expand_search)
+        return list(self._values_memo[memo_key])
+    
+    def _compute_values_around(self, param_name: str, current_value,
+                               max_tests: int, expand_search: bool) -> list:
         settings = self.params[param_name]
         is_time = isinstance(current_value, str) and ":" in current_value
         
         if is_time:
-            current = datetime.strptime(str(current_value), "%H:%M")
-            min_val = datetime.strptime(settings["min_value"], "%H:%M")
-            max_val = datetime.strptime(settings["max_value"], "%H:%M")
-            step = timedelta(minutes=int(settings["step"]))
-            fmt = lambda x: x.strftime("%H:%M")
+            # Minutes depuis minuit : arithmétique entière, "HH:MM" seulement en sortie
+            current = self._time_to_minutes(str(current_value))
+            min_val = self._time_to_minutes(settings["min_value"])
+            max_val = self._time_to_minutes(settings["max_value"])
+            step = int(settings["step"])
+            fmt = self._minutes_to_time
         else:
             current = float(current_value)
             min_val = float(settings["min_value"])
@@ -232,62 +312,205 @@ class ParamOptimizer:
             param_name, current_value, max_tests, expand_search=True
         )
         
-        # Filtre pour ne garder que les valeurs non testées
+        # Filtre pour ne garder que les valeurs non testées (les plus proches d'abord)
         untested_values = []
-        for value in all_possible_values:
-            test_config = current_config.copy()
-            test_config[param_name] = value
-            config_key = self._config_to_key(test_config)
-            
+        keys = self._neighbor_keys(current_config, param_name, all_possible_values)
+        for value, config_key in zip(all_possible_values, keys):
             if config_key not in self.config_cache:
                 untested_values.append(value)
-                if len(untested_values) >= max_tests:
+                if len(untested_values) >= self.ACQUISITION_POOL:
                     break
         
-        return untested_values
+        if len(untested_values) <= max_tests:
+            return untested_values
+        
+        # Plus de candidats que de tests disponibles : on garde ceux qui ont
+        # la meilleure amélioration espérée (EI) d'après les résultats connus
+        return self._rank_by_expected_improvement(param_name, current_config,
+                                                  untested_values, max_tests)
+
+    # ========== Acquisition (Expected Improvement) ==========
+    
+    # Nombre max de candidats non testés évalués par le modèle
+    ACQUISITION_POOL = 50
+    # Nombre de voisins utilisés par le modèle de substitution
+    ACQUISITION_NEIGHBORS = 5
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _time_to_minutes(time_str: str) -> int:
+        """Convertit "HH:MM" en minutes depuis minuit."""
+        hours, minutes = time_str.split(":")
+        return int(hours) * 60 + int(minutes)
+
+    @staticmethod
+    def _minutes_to_time(minutes: int) -> str:
+        """Convertit des minutes depuis minuit en "HH:MM"."""
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    def _config_vector(self, config: dict) -> list:
+        """
+        Projette une config sur les paramètres actifs, normalisés dans [0, 1]
+        (les heures HH:MM sont converties en minutes).
+        """
+        vector = []
+        for name in self.param_order:
+            settings = self.params[name]
+            value = config.get(name, settings["initial_value"])
+            low, high = settings["min_value"], settings["max_value"]
+            if isinstance(value, str) and ":" in value:
+                value, low, high = (self._time_to_minutes(t) for t in (value, low, high))
+            span = float(high) - float(low)
+            vector.append((float(value) - float(low)) / span if span > 0 else 0.0)
+        return vector
+
+    def _rank_by_expected_improvement(self, param_name: str, current_config: dict,
+                                      candidates: list, max_tests: int) -> list:
+        """
+        Classe les valeurs candidates par Expected Improvement et garde les max_tests meilleures.
+        
+        Modèle de substitution : k plus proches voisins sur self.all_results.
+        - mu    : moyenne des PnL voisins pondérée par 1/distance
+        - sigma : dispersion des voisins + incertitude croissante avec la distance
+        EI(x) = (mu - best)·Φ(z) + sigma·φ(z), avec z = (mu - best) / sigma
+        """
+        if len(self.all_results) < self.ACQUISITION_NEIGHBORS:
+            return candidates[:max_tests]
+        
+        X = np.array([self._config_vector(config) for _, config in self.all_results])
+        y = np.array([pnl for pnl, _ in self.all_results], dtype=float)
+        y_best = y.max()
+        y_scale = y.std() or 1.0
+        k = self.ACQUISITION_NEIGHBORS
+        
+        scores = []
+        original = current_config[param_name]
+        for value in candidates:
+            # Modifie puis restaure la config courante plutôt que de la copier
+            current_config[param_name] = value
+            vector = self._config_vector(current_config)
+            current_config[param_name] = original
+            distances = np.sqrt(((X - vector) ** 2).sum(axis=1))
+            nearest = np.argpartition(distances, k - 1)[:k]
+            
+            weights = 1.0 / (distances[nearest] + 1e-9)
+            mu = np.average(y[nearest], weights=weights)
+            spread = math.sqrt(np.average((y[nearest] - mu) ** 2, weights=weights))
+            sigma = spread + y_scale * distances[nearest].mean()
+            
+            if sigma <= 0:
+                scores.append(max(mu - y_best, 0.0))
+                continue
+            z = (mu - y_best) / sigma
+            cdf = 0.5 * (1.0 + math.erf(z / math.sqrt(2.0)))
+            pdf = math.exp(-0.5 * z * z) / math.sqrt(2.0 * math.pi)
+            scores.append((mu - y_best) * cdf + sigma * pdf)
+        
+        order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)
+        return [candidates[i] for i in order[:max_tests]]
 
     # ========== Simulation ==========
     
     def _test_params(self, param_values: dict) -> float:
         """🆕 Teste une config, utilise le cache si déjà testée."""
-        config_key = self._config_to_key(param_values)
-        
-        # Vérification dans le cache
-        if config_key in self.config_cache:
-            cached_pnl = self.config_cache[config_key]
-            print(f"      ♻️  Config déjà testée (cache) → PnL={cached_pnl:.2f}")
-            return cached_pnl
-        
-        # Nouvelle simulation
-        pnl = self.multi_file_simulator.run_all_files(param_values)['total_pnl']
-        
-        # Ajout au cache
-        self.config_cache[config_key] = pnl
+        return self._test_params_batch([param_values])[0]
+
+    def _test_params_batch(self, configs: list) -> list:
+        """
+        Teste plusieurs configs d'un coup : le cache est consulté d'abord, puis les
+        configs manquantes sont réparties sur le pool (une config entière par worker).
+        Retourne les PnL dans l'ordre de `configs`.
+        """
+        return self._test_keys_batch([self._config_to_key(config) for config in configs])
+
+    def _test_keys_batch(self, keys: list) -> list:
+        """Comme _test_params_batch, à partir des clés : le dict n'est recréé que pour les simulations."""
+        # Configs absentes du cache (dédoublonnées, ordre conservé)
+        misses = {}
+        hits = []
+        for key in keys:
+            if key in self.config_cache:
+                hits.append(self.config_cache[key])
+            elif key not in misses:
+                misses[key] = dict(key)
+        
+        # Une seule ligne par lot (et non une par config trouvée en cache)
+        if hits:
+            pnls = ", ".join(f"{pnl:.2f}" for pnl in hits)
+            print(f"      ♻️  {len(hits)} config(s) déjà testée(s) (cache) → PnL={pnls}")
+        
+        # Nouvelles simulations
+        if misses:
+            if self._pool is not None:
+                pnls = self._pool.map(_worker_run, misses.values())
+            else:
+                pnls = (self.multi_file_simulator.run_all_files(config, prices=self._prices)['total_pnl']
+                        for config in misses.values())
+            
+            # Ajout au cache
+            for key, pnl in zip(misses.keys(), pnls):
+                self.config_cache[key] = pnl
         
-        return pnl
+        return [self.config_cache[key] for key in keys]
+
+    def close(self):
+        """Écrit les derniers résultats en attente et arrête le pool de workers."""
+        self._flush_results()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _record_result(self, pnl: float, config: dict, config_key: tuple = None):
+        """Ajoute un résultat à all_results et à results.csv, une seule fois par config."""
+        if config_key is None:
+            config_key = self._config_to_key(config)
+        if config_key in self._written_keys:
+            return
+        self.all_results.append((pnl, config))
+        self._write_result({"pnl": pnl, **config}, config_key)
 
-    def _write_result(self, row: dict):
+    def _write_result(self, row: dict, config_key: tuple = None):
         """🆕 Écrit un résultat seulement s'il n'est pas déjà dans le fichier."""
-        config_key = self._config_to_key({k: v for k, v in row.items() if k != 'pnl'})
+        if config_key is None:
+            config_key = self._config_to_key({k: v for k, v in row.items() if k != 'pnl'})
+        
+        # Si déjà écrit (ou en attente d'écriture), ne pas réécrire
+        if config_key in self._written_keys:
+            return
+        self._written_keys.add(config_key)
         
-        # Si déjà en cache, ne pas réécrire
-        if config_key in self.config_cache:
+        # Écriture par lots : une ouverture du fichier toutes les 64 lignes
+        self._pending_rows.append(row)
+        if len(self._pending_rows) >= 64:
+            self._flush_results()
+
+    def _flush_results(self):
+        """Ajoute d'un coup les lignes en attente à results.csv."""
+        if not self._pending_rows:
             return
         
-        file_exists = os.path.exists(self.results_file) and os.stat(self.results_file).st_size > 0
+        if self._fieldnames is None:
+            self._fieldnames = list(self._pending_rows[0].keys())
+        
+        # Colonnes de l'en-tête existant : celles absentes de la ligne restent vides
+        # (métriques de chat4), celles absentes de l'en-tête sont ignorées
         with open(self.results_file, "a", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=row.keys())
-            if not file_exists:
+            writer = csv.DictWriter(f, fieldnames=self._fieldnames, restval="", extrasaction="ignore")
+            if not self._header_written:
                 writer.writeheader()
-            writer.writerow(row)
+                self._header_written = True
+            writer.writerows(self._pending_rows)
+        self._pending_rows.clear()
 
     def _save_best(self, top_n: int):
-        """Sauvegarde les N meilleures configs."""
-        self.all_results.sort(reverse=True, key=lambda x: x[0])
+        """Sauvegarde les N meilleures configs (et vide le tampon de results.csv)."""
+        self._flush_results()
+        # Sélection des N meilleurs sans retrier tout l'historique à chaque itération
+        best = heapq.nlargest(top_n, self.all_results, key=lambda x: x[0])
         with open(self.best_file, "w", newline="") as f:
             writer = csv.DictWriter(f, fieldnames=["pnl"] + list(self.params.keys()))
             writer.writeheader()
-            for pnl, params in self.all_results[:top_n]:
+            for pnl, params in best:
                 writer.writerow({"pnl": pnl, **params})
 
     # ========== Optimisation d'un paramètre ==========
@@ -319,23 +542,21 @@ class ParamOptimizer:
             test_values = self._generate_values_around_current(param_name, current_value, max_tests)
             print(f"  🔍 {param_name} (P{priority}): current={current_value} → test={test_values}")
         
-        param_results = []
+        # Test de toutes les valeurs en un seul lot (réparti sur le pool)
+        keys = self._neighbor_keys(current_config, param_name, test_values)
+        pnls = self._test_keys_batch(keys)
         
-        # Test de chaque valeur
-        for value in test_values:
-            test_config = current_config.copy()
-            test_config[param_name] = value
-            
-            pnl = self._test_params(test_config)
-            param_results.append((pnl, value, test_config.copy()))
-            self.all_results.append((pnl, test_config))
-            self._write_result({"pnl": pnl, **test_config})
+        for value, key, pnl in zip(test_values, keys, pnls):
+            # Le centre (et toute config déjà connue) n'est pas réenregistré
+            if key not in self._written_keys:
+                self._record_result(pnl, {**current_config, param_name: value}, key)
         
-        # Sélection de la meilleure valeur
-        param_results.sort(reverse=True, key=lambda x: x[0])
-        best_pnl, best_value, best_config = param_results[0]
+        # Sélection de la meilleure valeur (premier maximum en cas d'égalité)
+        best = int(np.argmax(pnls))
+        best_value = test_values[best]
+        best_config = {**current_config, param_name: best_value}
         
-        return best_pnl, best_value, best_config
+        return pnls[best], best_value, best_config
 
     # ========== Optimisation itérative complète ==========
     
@@ -386,8 +607,7 @@ class ParamOptimizer:
         print(f"♻️  Configurations en cache: {len(self.config_cache)}")
         print(f"{'='*80}")
         
-        self.all_results.append((current_best_pnl, current_best_config.copy()))
-        self._write_result({"pnl": current_best_pnl, **current_best_config})
+        self._record_result(current_best_pnl, current_best_config.copy())
         
         # Boucle d'optimisation itérative
         for iteration in range(1, max_iterations + 1):
@@ -583,7 +803,10 @@ def main():
         optimizer.save_params(DEFAULT_PARAMS)
     
     # Lance l'optimisation (utilise automatiquement la meilleure config précédente)
-    optimizer.run_optimization(max_tests_per_param=3, max_iterations=10000)
+    try:
+        optimizer.run_optimization(max_tests_per_param=3, max_iterations=10000)
+    finally:
+        optimizer.close()
     
     # Pour forcer un reset depuis les valeurs initiales:
     # optimizer.run_optimization(max_tests_per_param=3, max_iterations=10, reset_from_initial=True)
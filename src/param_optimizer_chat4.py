@@ -13,11 +13,18 @@ Version modifiée pour inclure :
 import json
 import csv
 import os
+import atexit
+import functools
+import hashlib
+import sqlite3
 import glob
-import math
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
 from itertools import product
-from datetime import datetime, timedelta
-from multi_file_simulator import MultiFileSimulator
+from concurrent.futures import ProcessPoolExecutor
+from multi_file_simulator import MultiFileSimulator, cpu_count, pool_context
 
 
 # ================================================================
@@ -37,14 +44,32 @@ class Display:
 # ================================================================
 # SIMULATOR — return pnl, nb_trades, roi, win_rate, drawdown
 # ================================================================
+@functools.lru_cache(maxsize=1)
+def _data_files():
+    # Parcours récursif du dataset fait une seule fois par processus
+    return tuple(glob.glob('../../data/prices_data/dataset3/**/*.lz4', recursive=True))
+
+
 class TradingSimulator:
     def __init__(self, data_files=None, parallel=True):
         if data_files is None:
-            data_files = glob.glob('../../data/prices_data/dataset3/**/*.lz4', recursive=True)
+            data_files = _data_files()
         self.backend = MultiFileSimulator(data_files=data_files, parallel=parallel, verbose=False)
+        # Décompression unique des .lz4 : chaque run ne coûte plus que la simulation
+        self.backend.preload()
 
     def run(self, config):
-        result = self.backend.run_all_files(config)
+        return self._metrics(self.backend.run_all_files(config))
+
+    def run_batch(self, configs):
+        # Plusieurs configs en un seul passage sur les fichiers
+        return [self._metrics(r) for r in self.backend.run_all_files_batch(configs)]
+
+    def close(self):
+        self.backend.close()
+
+    @staticmethod
+    def _metrics(result):
         return (
             result["total_pnl"],
             result["total_trades"],
@@ -55,74 +80,262 @@ class TradingSimulator:
 
 
 # ================================================================
-# RESULT CACHE
+# WORKERS — un lot de configs entières par worker
 # ================================================================
-def _parse_value(v):
-    try: return int(v)
-    except: pass
-    try: return float(v)
-    except: return v
-
+_WORKER_SIM = None
 
-class ResultCache:
-    def __init__(self, filename):
-        self.filename = filename
-        self.data = {}
-        if os.path.exists(filename):
-            self._load()
 
-    def _load(self):
-        with open(self.filename) as f:
-            rd = csv.DictReader(f)
-            for row in rd:
+def _init_worker(data_files):
+    # Simulateur local au worker, créé une seule fois (séquentiel : le pool parallélise déjà les configs)
+    global _WORKER_SIM
+    _WORKER_SIM = TradingSimulator(data_files=data_files, parallel=False)
 
-                pnl = float(row.pop("pnl"))
 
-                # rétro-compatibilité si colonnes absentes
-                nb_trades = int(float(row.pop("nb_trades", 0)))
-                roi = float(row.pop("roi", pnl / nb_trades if nb_trades > 0 else 0.0))
-                win_rate = float(row.pop("win_rate", 0.0))
-                drawdown = float(row.pop("drawdown", 0.0))
+def _worker_eval_batch(cfgs):
+    # Un seul passage sur les fichiers pour tout le lot (table partagée entre les configs)
+    return _WORKER_SIM.run_batch(cfgs)
 
-                cfg = {k: _parse_value(v) for k, v in row.items()}
-                key = self.key(cfg)
 
-                self.data[key] = (pnl, nb_trades, roi, win_rate, drawdown)
+# ================================================================
+# RESULT CACHE
+# ================================================================
+class ResultCache:
+    # Lignes écrites entre deux flush du CSV (et commit de l'index)
+    FLUSH_EVERY = 16
+    # Résultats récents gardés en mémoire devant l'index (LRU)
+    LRU_SIZE = 100_000
+    # Filtre de Bloom des empreintes de l'index : 2^22 bits (512 Ko), 2 bits par clé
+    BLOOM_BITS = 22
+    # Version du calcul des empreintes (PRAGMA user_version) : un index d'une autre version est reconstruit
+    INDEX_VERSION = 1
 
-        Display.info("Cache chargé : " + str(len(self.data)) + " entrées")
+    def __init__(self, filename):
+        self.filename = filename
+        # Index SQLite des résultats : ouvert en O(1) et rien n'est chargé en mémoire.
+        # Le CSV reste le journal lisible ; l'index est reconstruit s'il est plus ancien.
+        self.index = filename + ".sqlite"
+        self._db = None
+        if self._index_is_fresh() and self._open_index():
+            Display.info("Cache ouvert : " + str(len(self)) + " entrées")
+        else:
+            if os.path.exists(self.index):
+                os.remove(self.index)
+            self._open_index()
+            if os.path.exists(filename):
+                self._load()
+            self._db.commit()
+
+        # Les configs jamais vues (la majorité pendant la recherche) sont écartées
+        # par le filtre de Bloom sans requête SQLite ; les hits récents restent en mémoire
+        self._recent = OrderedDict()
+        self._bloom = self._take_bloom()
+        if self._bloom is None:
+            self._bloom = bytearray(1 << (self.BLOOM_BITS - 3))
+            for (h,) in self._db.execute("SELECT hash FROM results"):
+                self._bloom_add(h)
+
+        # Fichier ouvert une seule fois en ajout (au premier store)
+        self._fh = None
+        self._writer = None
+        self._write_header = False
+        self._unflushed = 0
+
+    def _index_is_fresh(self):
+        # Valide seulement s'il est au moins aussi récent que le CSV
+        return (os.path.exists(self.filename) and os.path.exists(self.index)
+                and os.path.getmtime(self.index) >= os.path.getmtime(self.filename))
+
+    def _open_index(self):
+        try:
+            self._db = sqlite3.connect(self.index)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "hash INTEGER PRIMARY KEY, pnl REAL, nb_trades INTEGER, roi REAL, win_rate REAL, drawdown REAL)"
+            )
+            # Index d'un ancien format (clé texte) → reconstruit
+            self._db.execute("SELECT hash FROM results LIMIT 0")
+            # Empreintes calculées autrement (index non vide d'une autre version) → reconstruit
+            if self._db.execute("PRAGMA user_version").fetchone()[0] != self.INDEX_VERSION:
+                if self._db.execute("SELECT 1 FROM results LIMIT 1").fetchone() is not None:
+                    raise sqlite3.DatabaseError("empreintes d'une version précédente")
+                self._db.execute("PRAGMA user_version = " + str(self.INDEX_VERSION))
+            # Filtre de Bloom sauvegardé à la fermeture (cf. _take_bloom)
+            self._db.execute("CREATE TABLE IF NOT EXISTS bloom (bits BLOB NOT NULL)")
+        except sqlite3.DatabaseError as e:
+            Display.warn("Index illisible (" + str(e) + ") → relecture du CSV")
+            self._db.close()
+            self._db = None
+            return False
+        return True
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def _take_bloom(self):
+        """
+        Filtre de Bloom sauvegardé par close(), ou None s'il manque (ou n'a pas la taille
+        de BLOOM_BITS) : il faut alors le recalculer en parcourant l'index.
+        Il est retiré de l'index tant que le cache est ouvert : après un arrêt brutal,
+        le démarrage suivant le recalcule au lieu de relire un filtre incomplet.
+        """
+        row = self._db.execute("SELECT bits FROM bloom").fetchone()
+        self._db.execute("DELETE FROM bloom")
+        self._db.commit()
+        if row is None or len(row[0]) != 1 << (self.BLOOM_BITS - 3):
+            return None
+        return bytearray(row[0])
 
-    def key(self, cfg):
-        return json.dumps(cfg, sort_keys=True)
+    def _load(self):
+        # Parsing et typage des colonnes en C (int/float/str inférés par colonne)
+        df = pd.read_csv(self.filename, on_bad_lines="skip", float_precision="round_trip")
+        if df.empty:
+            Display.info("Cache chargé : 0 entrées")
+            return
+
+        def metric(name, default):
+            # rétro-compatibilité si colonne absente
+            if name in df:
+                return df.pop(name).astype(float)
+            return pd.Series(default, index=df.index, dtype=float)
+
+        pnl = metric("pnl", 0.0)
+        nb_trades = metric("nb_trades", 0).astype(int)
+        roi = metric("roi", float("nan")).fillna((pnl / nb_trades).where(nb_trades > 0, 0.0))
+        win_rate = metric("win_rate", 0.0)
+        drawdown = metric("drawdown", 0.0)
+        if "drawdown_pct" in df:
+            df.pop("drawdown_pct")  # colonne dérivée, ne fait pas partie de la config
+
+        # Clés construites colonne par colonne, dans l'ordre trié de key()
+        names = sorted(df.columns)
+        rows = zip(*(df[name].tolist() for name in names))
+        metrics = zip(pnl.tolist(), nb_trades.tolist(), roi.tolist(), win_rate.tolist(), drawdown.tolist())
+        self._db.executemany(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+            ((self._dump(tuple(zip(names, values))), *m) for values, m in zip(rows, metrics))
+        )
 
-    def get(self, cfg):
-        return self.data.get(self.key(cfg))
+        Display.info("Cache chargé : " + str(len(self)) + " entrées")
 
-    def store(self, cfg, pnl, nb_trades, roi, win_rate, drawdown):
-        key = self.key(cfg)
-        self.data[key] = (pnl, nb_trades, roi, win_rate, drawdown)
+    def key(self, cfg):
+        # Tuple des paires (nom, valeur) triées : bien plus rapide à calculer et hacher qu'un JSON
+        return tuple(sorted(cfg.items()))
 
-        write_header = not os.path.exists(self.filename)
-        
-        drawdown_pct = (drawdown / pnl * 100) if pnl != 0 else 0.0
+    @staticmethod
+    def _canonical(value):
+        # 50 et 50.0 désignent la même config : même empreinte. Les configs mélangent les deux
+        # (center + units * step) et pandas relit en float les entiers d'une colonne mixte
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
 
-        with open(self.filename, "a", newline="") as f:
-            fieldnames = ["pnl", "nb_trades", "roi", "win_rate", "drawdown", "drawdown_pct"] + list(cfg.keys())
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
+    @classmethod
+    def _dump(cls, key):
+        # Empreinte 64 bits signée de la clé (valeurs numériques normalisées, cf. _canonical) :
+        # stable d'un processus à l'autre, contrairement à hash(), et directement rowid SQLite
+        canonical = [(name, cls._canonical(value)) for name, value in key]
+        digest = hashlib.blake2b(json.dumps(canonical).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little", signed=True)
+
+    def _bloom_bits(self, h):
+        mask = (1 << self.BLOOM_BITS) - 1
+        return h & mask, (h >> self.BLOOM_BITS) & mask
+
+    def _bloom_add(self, h):
+        for b in self._bloom_bits(h):
+            self._bloom[b >> 3] |= 1 << (b & 7)
+
+    def _bloom_has(self, h):
+        return all(self._bloom[b >> 3] & (1 << (b & 7)) for b in self._bloom_bits(h))
+
+    def _remember(self, key, metrics):
+        self._recent[key] = metrics
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.LRU_SIZE:
+            self._recent.popitem(last=False)
+
+    def get(self, cfg, key=None):
+        # key : clé déjà calculée par l'appelant (évite de retrier la config)
+        if key is None:
+            key = self.key(cfg)
+        metrics = self._recent.get(key)
+        if metrics is not None:
+            self._recent.move_to_end(key)
+            return metrics
+
+        h = self._dump(key)
+        if not self._bloom_has(h):
+            return None
+        metrics = self._db.execute(
+            "SELECT pnl, nb_trades, roi, win_rate, drawdown FROM results WHERE hash = ?", (h,)
+        ).fetchone()
+        if metrics is not None:
+            self._remember(key, metrics)
+        return metrics
+
+    def store(self, cfg, pnl, nb_trades, roi, win_rate, drawdown, key=None):
+        if key is None:
+            key = self.key(cfg)
+        h = self._dump(key)
+        self._db.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+            (h, pnl, nb_trades, roi, win_rate, drawdown)
+        )
+        self._bloom_add(h)
+        self._remember(key, (pnl, nb_trades, roi, win_rate, drawdown))
 
-            if write_header:
-                writer.writeheader()
+        if self._fh is None:
+            self._write_header = not os.path.exists(self.filename) or os.path.getsize(self.filename) == 0
+            self._fh = open(self.filename, "a", newline="", buffering=1 << 16)
+            atexit.register(self.close)
 
-            row = {
-                "pnl": pnl,
-                "nb_trades": nb_trades,
-                "roi": roi,
-                "win_rate": win_rate,
-                "drawdown": drawdown,
-                "drawdown_pct": drawdown_pct
-            }
-            row.update(cfg)
+        drawdown_pct = (drawdown / pnl * 100) if pnl != 0 else 0.0
 
-            writer.writerow(row)
+        fieldnames = ["pnl", "nb_trades", "roi", "win_rate", "drawdown", "drawdown_pct"] + list(cfg.keys())
+        if self._writer is None or self._writer.fieldnames != fieldnames:
+            self._writer = csv.DictWriter(self._fh, fieldnames=fieldnames)
+
+        if self._write_header:
+            self._writer.writeheader()
+            self._write_header = False
+
+        row = {
+            "pnl": pnl,
+            "nb_trades": nb_trades,
+            "roi": roi,
+            "win_rate": win_rate,
+            "drawdown": drawdown,
+            "drawdown_pct": drawdown_pct
+        }
+        row.update(cfg)
+
+        self._writer.writerow(row)
+
+        self._unflushed += 1
+        if self._unflushed >= self.FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if self._fh is not None:
+            self._fh.flush()
+        # Commit après le CSV pour que l'index soit le plus récent des deux
+        if self._db is not None:
+            self._db.commit()
+        self._unflushed = 0
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+            self._writer = None
+        if self._db is not None:
+            # Le filtre complet est rangé avec l'index : la prochaine ouverture reste en O(1)
+            self._db.execute("DELETE FROM bloom")
+            self._db.execute("INSERT INTO bloom VALUES (?)", (bytes(self._bloom),))
+            self._db.commit()
+            self._db.close()
+            self._db = None
+        self._unflushed = 0
 
 
 # ================================================================
@@ -137,34 +350,90 @@ class Parameter:
         self.step = meta["step"]
         self.enabled = meta.get("enabled", True)
 
+        # Bornes et pas parsés une seule fois (immuables pendant la recherche)
+        # Heures "HH:MM" → minutes depuis minuit : arithmétique entière, sans datetime
+        self._is_time = isinstance(self.initial, str) and ":" in self.initial
+        if self._is_time:
+            self._min_parsed = self.to_minutes(self.min)
+            self._max_parsed = self.to_minutes(self.max)
+            self._step_parsed = int(self.step)
+            # (centre "HH:MM", unités) → heure décalée : peu de combinaisons distinctes
+            self._time_offsets = {}
+        else:
+            self._min_parsed = self.min
+            self._max_parsed = self.max
+            self._step_parsed = self.step
+
     def is_time(self):
-        return isinstance(self.initial, str) and ":" in self.initial
+        return self._is_time
 
-    def apply_offset(self, center, units):
-        if self.is_time():
-            to_dt = lambda s: datetime.strptime(s, "%H:%M")
-            ct = to_dt(center)
-            new = ct + timedelta(minutes=int(units) * int(self.step))
-            if new < to_dt(self.min) or new > to_dt(self.max):
-                return None
-            return new.strftime("%H:%M")
+    def parsed_bounds(self):
+        """(min, max, pas) numériques : minutes depuis minuit pour les heures."""
+        return self._min_parsed, self._max_parsed, self._step_parsed
+
+    @staticmethod
+    def to_minutes(hhmm):
+        hours, minutes = hhmm.split(":")
+        return int(hours) * 60 + int(minutes)
 
-        value = center + units * self.step
-        if value < self.min or value > self.max:
+    @staticmethod
+    def format(minutes):
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    def apply_offset(self, center, units):
+        if self._is_time:
+            key = (center, units)
+            if key not in self._time_offsets:
+                new = self.to_minutes(center) + int(units) * self._step_parsed
+                in_bounds = self._min_parsed <= new <= self._max_parsed
+                self._time_offsets[key] = self.format(new) if in_bounds else None
+            return self._time_offsets[key]
+
+        value = center + units * self._step_parsed
+        if value < self._min_parsed or value > self._max_parsed:
             return None
         return value
 
+    def contains(self, value):
+        try:
+            if self._is_time:
+                value = self.to_minutes(value)
+            return self._min_parsed <= value <= self._max_parsed
+        except (TypeError, ValueError, AttributeError):
+            return False
+
+    def close_bounds(self, bounds, tolerance):
+        """
+        True si (min, max, pas) d'un autre espace sont proches des nôtres :
+        bornes à moins de tolerance × étendue, pas à moins de tolerance × pas.
+        """
+        try:
+            low, high, step = bounds
+            if self._is_time:
+                low, high, step = self.to_minutes(low), self.to_minutes(high), int(step)
+            width = tolerance * max(self._max_parsed - self._min_parsed, self._step_parsed)
+            return (abs(low - self._min_parsed) <= width and abs(high - self._max_parsed) <= width
+                    and abs(step - self._step_parsed) <= tolerance * self._step_parsed)
+        except (TypeError, ValueError, AttributeError):
+            return False
+
 
 class ParameterSpace:
     def __init__(self, filename):
         self.filename = filename
         self.params = {}
+        self._loaded_key = None
 
     def load(self):
+        # Pas de re-parsing si le fichier n'a pas changé depuis le dernier chargement
+        key = (self.filename, os.path.getmtime(self.filename))
+        if key == self._loaded_key:
+            return
+
         with open(self.filename) as f:
             raw = json.load(f)
-        for k, v in raw.items():
-            self.params[k] = Parameter(k, v)
+        self.params = {k: Parameter(k, v) for k, v in raw.items()}
+        self._loaded_key = key
 
     def active(self):
         return [p for p in self.params.values() if p.enabled]
@@ -172,53 +441,167 @@ class ParameterSpace:
     def initial_config(self):
         return {k: p.initial for k, p in self.params.items()}
 
+    def signature(self):
+        """Bornes et pas de chaque paramètre : identifie l'espace de recherche."""
+        return {k: [p.min, p.max, p.step] for k, p in self.params.items()}
+
+    def similarity(self, signature, tolerance):
+        """Part des paramètres dont les bornes sont proches dans une autre signature."""
+        if not self.params:
+            return 0.0
+        close = sum(1 for k, p in self.params.items()
+                    if k in signature and p.close_bounds(signature[k], tolerance))
+        return close / len(self.params)
+
+    def project(self, config):
+        """
+        Config d'un autre espace ramenée sur celui-ci : les paramètres actifs reprennent
+        leur valeur si elle est dans les bornes, tout le reste sa valeur initiale.
+        """
+        return {k: config[k] if p.enabled and k in config and p.contains(config[k]) else p.initial
+                for k, p in self.params.items()}
+
 
 # ================================================================
 # BEST CONFIG
 # ================================================================
 class BestConfig:
+    """
+    Meilleure config de l'espace de paramètres courant, plus celles des espaces
+    précédents ("history") : si params.json a changé, la recherche repart de la
+    meilleure config d'un espace voisin plutôt que des valeurs initiales.
+    """
+    # Délai minimal (s) entre deux réécritures du fichier pendant la recherche
+    FLUSH_SECONDS = 5.0
+    # Nombre max d'espaces mémorisés (courant compris)
+    MAX_ENTRIES = 20
+    # Écart toléré sur bornes et pas (relatif) pour qu'un paramètre soit « proche »
+    BOUND_TOLERANCE = 0.2
+    # Part minimale de paramètres proches pour repartir d'un autre espace
+    MIN_SIMILARITY = 0.5
+
     def __init__(self, filename):
         self.filename = filename
         self.config = None
         self.pnl = float('-inf')
+        self.signature = None
+        self._history = []
+        self._dirty = False
+        self._last_flush = 0.0
+        atexit.register(self.flush)
 
     def load(self, space):
+        """
+        Retourne (config de départ, PnL) ; PnL à None s'il n'est pas connu pour cette config
+        exacte (pas de fichier, config complétée ou reprise d'un autre espace) et doit être évalué.
+        """
+        self.signature = space.signature()
         if not os.path.exists(self.filename):
             self.config = space.initial_config()
-            return self.config
+            return self.config, None
 
         with open(self.filename) as f:
             d = json.load(f)
 
-        self.config = d["config"]
-        self.pnl = d["pnl"]
-        
-        # Compléter avec les nouveaux paramètres manquants
-        for k, v in space.initial_config().items():
-            if k not in self.config:
-                self.config[k] = v
-        
-        return self.config.copy()
+        # Ancien format (sans "space") : considéré comme l'espace courant
+        entries = [d] + d.get("history", [])
+        self._history = [e for e in entries if e.get("space") not in (None, self.signature)]
+        exact = [e for e in entries if e.get("space") in (None, self.signature)]
+
+        if exact:
+            self.config = exact[0]["config"]
+            self.pnl = exact[0]["pnl"]
+
+            # Compléter avec les nouveaux paramètres manquants
+            completed = False
+            for k, v in space.initial_config().items():
+                if k not in self.config:
+                    self.config[k] = v
+                    completed = True
+
+            return self.config.copy(), None if completed else self.pnl
+
+        scored = [(space.similarity(e["space"], self.BOUND_TOLERANCE), e["pnl"], e) for e in self._history]
+        similarity, pnl, entry = max(scored, key=lambda t: t[:2])
+        if similarity < self.MIN_SIMILARITY:
+            self.config = space.initial_config()
+            return self.config, None
+
+        # PnL non repris : il portait sur une config d'un autre espace
+        Display.info(f"Départ depuis la meilleure config d'un espace voisin "
+                     f"({similarity:.0%} des paramètres proches, PnL {pnl})")
+        self.config = space.project(entry["config"])
+        return self.config.copy(), None
+
+    def record_start(self, cfg, pnl):
+        """
+        Enregistre la config de départ une fois évaluée dans l'espace courant (load a renvoyé
+        un PnL à None) : l'espace courant a dès lors son entrée, le démarrage suivant repart
+        de cette config au lieu de refaire la même reprise depuis l'espace voisin.
+        """
+        self.config = cfg.copy()
+        self.pnl = pnl
+        self._dirty = True
+        self.flush()
 
     def update(self, cfg, pnl):
         if pnl > self.pnl:
             self.pnl = pnl
             self.config = cfg.copy()
-            with open(self.filename, "w") as f:
-                json.dump({"pnl": pnl, "config": cfg}, f, indent=4)
+            self._dirty = True
+            if time.monotonic() - self._last_flush >= self.FLUSH_SECONDS:
+                self.flush()
             Display.success("Nouveau record global : " + str(pnl))
 
+    def flush(self):
+        # Écriture atomique : le fichier n'est jamais à moitié écrit
+        if not self._dirty:
+            return
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w") as f:
+            # indent=1 : une clé par ligne (diff lisible), deux fois moins d'octets qu'indent=4
+            json.dump({"pnl": self.pnl, "config": self.config, "space": self.signature,
+                       "history": self._history[:self.MAX_ENTRIES - 1]}, f, indent=1)
+        os.replace(tmp, self.filename)
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
 
 # ================================================================
 # OPTIMIZER
 # ================================================================
 class ParamOptimizer:
-    def __init__(self, sim, param_file, cache_file, best_file):
+    # Configs simulées ensemble par un worker (ou par le simulateur en séquentiel)
+    BATCH_PER_WORKER = 8
+
+    def __init__(self, sim, param_file, cache_file, best_file, parallel=False):
         self.sim = sim
         self.space = ParameterSpace(param_file)
         self.cache = ResultCache(cache_file)
         self.best = BestConfig(best_file)
 
+        # Pool de configs : à combiner avec un TradingSimulator(parallel=False)
+        # Le cache reste dans ce processus : evaluate_batch le consulte et dédoublonne
+        # les configs avant l'envoi, les workers ne font que simuler (pas de cache partagé
+        # à synchroniser, aucune config simulée deux fois)
+        self.workers = cpu_count() if parallel else 1
+        self.pool = None
+        if parallel:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context(),
+                                            initializer=_init_worker, initargs=(sim.backend.data_files,))
+
+        # Nombre d'offsets d'une sphère évalués ensemble : BATCH_PER_WORKER par worker.
+        # Un lot coûte bien moins que ses configs une à une (un seul passage sur les ticks),
+        # mais au-delà les évaluations spéculatives après une amélioration l'emportent
+        self.batch_size = self.BATCH_PER_WORKER * self.workers
+
+    def close(self):
+        self.cache.close()
+        self.best.flush()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
     def evaluate(self, cfg):
 
         cached = self.cache.get(cfg)
@@ -232,56 +615,261 @@ class ParamOptimizer:
 
         return pnl
 
-
-    def generate_spherical_offsets(self, params, R):
+    def evaluate_batch(self, cfgs):
+        """
+        Évalue plusieurs configs : cache d'abord, puis un seul run_batch
+        pour les configs manquantes. Retourne les PnL dans l'ordre de `cfgs`.
+        """
+        pnls = [None] * len(cfgs)
+        misses = {}
+        for i, cfg in enumerate(cfgs):
+            # Clé calculée une seule fois par config : get, regroupement et store
+            key = self.cache.key(cfg)
+            cached = self.cache.get(cfg, key)
+            if cached is not None:
+                pnls[i] = cached[0]
+            else:
+                misses.setdefault(key, []).append(i)
+
+        if misses:
+            todo = [cfgs[idx[0]] for idx in misses.values()]
+            if self.pool is not None:
+                size = -(-len(todo) // self.workers)
+                chunks = [todo[i:i + size] for i in range(0, len(todo), size)]
+                results = [m for chunk in self.pool.map(_worker_eval_batch, chunks) for m in chunk]
+            else:
+                results = self.sim.run_batch(todo)
+            for cfg, (key, idx), metrics in zip(todo, misses.items(), results):
+                self.cache.store(cfg, *metrics, key=key)
+                for i in idx:
+                    pnls[i] = metrics[0]
+
+        return pnls
+
+    def apply_offsets(self, center, params, offset_vec):
+        """Config décalée de offset_vec (en pas) autour de center, None si hors bornes."""
+        values = []
+        for p, units in zip(params, offset_vec):
+            newv = p.apply_offset(center[p.name], units)
+            if newv is None:
+                return None
+            values.append(newv)
+        # Copie seulement pour les configs dans les bornes
+        cfg = center.copy()
+        for p, newv in zip(params, values):
+            cfg[p.name] = newv
+        return cfg
+
+
+    def generate_spherical_offsets(self, params, R, center=None):
+        """
+        Offsets de la sphère de rayon R : sondes axiales puis combinaisons.
+        center : si donné, les combinaisons hors bornes autour de ce centre sont
+        écartées d'un coup en numpy. À ne passer que si le centre ne bouge pas
+        pendant la sphère (sinon apply_offsets vérifie les bornes offset par offset).
+        """
         n = len(params)
-        for vector in product(range(-R, R + 1), repeat=n):
-            if all(v == 0 for v in vector):
-                continue
-            dist = math.sqrt(sum(v * v for v in vector))
-            if abs(dist - R) < 1e-9 or int(dist) == R:
-                yield vector
 
+        # Recherche par motif : d'abord les sondes axiales ±1..±R (un seul axe non nul),
+        # déjà en cache pour la plupart ; elles alimentent le modèle additif...
+        axis_offsets = []
+        for i in range(n):
+            for k in range(1, R + 1):
+                for units in (-k, k):
+                    vector = [0] * n
+                    vector[i] = units
+                    axis_offsets.append(tuple(vector))
+        yield from sorted(axis_offsets, key=lambda v: (sum(abs(u) for u in v), v))
+
+        # ...puis les combinaisons de plusieurs axes sur la coquille R <= |v| < R+1
+        table = self._shell_offsets(n, R)
+        if center is not None and len(table):
+            table = table[self._in_bounds(center, params, table)]
+        for start in range(0, len(table), self.SHELL_BLOCK):
+            for row in table[start:start + self.SHELL_BLOCK].tolist():
+                yield tuple(row)
 
-    def spherical_search(self):
+    @staticmethod
+    def _in_bounds(center, params, offsets):
+        """Masque des offsets (m, n) qui restent dans les bornes de tous les paramètres autour de center."""
+        origin = np.array([p.to_minutes(center[p.name]) if p.is_time() else center[p.name] for p in params],
+                          dtype=np.float64)
+        lows, highs, steps = (np.array(column, dtype=np.float64) for column in zip(*(p.parsed_bounds() for p in params)))
+        # Même calcul que apply_offset : centre + unités * pas
+        values = origin + offsets * steps
+        return ((values >= lows) & (values <= highs)).all(axis=1)
+
+    # Taille max (en vecteurs) de la grille des derniers axes filtrée en numpy
+    SHELL_BLOCK = 1 << 17
+    # Coquilles déjà calculées {(n, R): tableau des offsets}, réutilisées d'une recherche à l'autre.
+    # LRU bornée en octets : R croît tant que la recherche dure, chaque coquille ne sert qu'une
+    # fois par recherche et les grandes coquilles pèsent des centaines de Mo
+    OFFSET_CACHE_BYTES = 64 << 20
+    _OFFSET_CACHE = OrderedDict()
+    _offset_cache_bytes = 0
+
+    @classmethod
+    def _shell_offsets(cls, n, R):
+        """
+        Tableau (m, n) des vecteurs entiers de [-R, R]^n à au moins 2 composantes
+        non nulles avec R² <= |v|² < (R+1)², dans l'ordre de itertools.product.
+        Les derniers axes forment une grille filtrée en numpy ; seuls les
+        premiers axes (préfixes) sont parcourus en Python.
+        """
+        key = (n, R)
+        if key in cls._OFFSET_CACHE:
+            cls._OFFSET_CACHE.move_to_end(key)
+            return cls._OFFSET_CACHE[key]
+        if n < 2:
+            return cls._cache_offsets(key, np.empty((0, n), dtype=np.int16))
+
+        side = 2 * R + 1
+        tail_n = n
+        while tail_n > 1 and side ** tail_n > cls.SHELL_BLOCK:
+            tail_n -= 1
+        head_n = n - tail_n
+
+        axes = np.arange(-R, R + 1, dtype=np.int16)
+        tail = np.stack(np.meshgrid(*[axes] * tail_n, indexing="ij"), axis=-1).reshape(-1, tail_n)
+        tail_d2 = (tail.astype(np.int64) ** 2).sum(axis=1)
+        tail_nnz = (tail != 0).sum(axis=1)
+        low, high = R * R, (R + 1) * (R + 1)
+
+        blocks = []
+        for head in product(range(-R, R + 1), repeat=head_n):
+            head_d2 = sum(v * v for v in head)
+            if head_d2 >= high:
+                continue
+            head_nnz = sum(1 for v in head if v)
+            d2 = tail_d2 + head_d2
+            mask = (d2 >= low) & (d2 < high) & (tail_nnz + head_nnz >= 2)
+            block = tail[mask]
+            if len(block):
+                prefix = np.broadcast_to(np.array(head, dtype=np.int16), (len(block), head_n))
+                blocks.append(np.hstack([prefix, block]))
+
+        table = np.concatenate(blocks) if blocks else np.empty((0, n), dtype=np.int16)
+        return cls._cache_offsets(key, table)
+
+    @classmethod
+    def _cache_offsets(cls, key, table):
+        """Garde table dans _OFFSET_CACHE en évinçant les plus anciennes coquilles au-delà du budget."""
+        if table.nbytes > cls.OFFSET_CACHE_BYTES:
+            return table
+        cls._OFFSET_CACHE[key] = table
+        cls._offset_cache_bytes += table.nbytes
+        while cls._offset_cache_bytes > cls.OFFSET_CACHE_BYTES:
+            _, evicted = cls._OFFSET_CACHE.popitem(last=False)
+            cls._offset_cache_bytes -= evicted.nbytes
+        return table
+
+    def predicted_no_gain(self, center, center_pnl, params, offset_vec, axis_gains):
+        """
+        Modèle additif : une combinaison de plusieurs axes n'est évaluée que si
+        la somme des gains de ses sondes axiales (déjà en cache) est positive.
+        Si une sonde axiale est inconnue, pas de prédiction : la combinaison est évaluée.
+        axis_gains mémorise les gains connus {(axe, unités): gain} pour ce centre.
+        """
+        axes = [(i, units) for i, units in enumerate(offset_vec) if units]
+        if len(axes) < 2:
+            return False
+
+        gain = 0.0
+        for axis in axes:
+            if axis not in axis_gains:
+                i, units = axis
+                # Modifie puis restaure le centre : seule la clé de cache est utile
+                name = params[i].name
+                original = center[name]
+                center[name] = params[i].apply_offset(original, units)
+                cached = self.cache.get(center)
+                center[name] = original
+                if cached is None:
+                    return False
+                axis_gains[axis] = cached[0] - center_pnl
+            gain += axis_gains[axis]
+        return gain <= 0
+
+
+    def spherical_search(self, first_improvement=True):
+        """
+        Recherche par sphères de rayon croissant autour de la meilleure config.
+        first_improvement : dès qu'une config améliore le record, la sphère en cours
+        est abandonnée et la recherche repart de R = 1 autour du nouveau centre.
+        Sinon la sphère est parcourue en entier (le centre suit les améliorations)
+        avant de passer au rayon suivant.
+        """
         self.space.load()
         params = self.space.active()
 
-        best_cfg = self.best.load(self.space)
-        best_pnl = self.evaluate(best_cfg)
+        # PnL du fichier repris tel quel : pas de simulation de la config de départ
+        best_cfg, best_pnl = self.best.load(self.space)
+        if best_pnl is None:
+            best_pnl = self.evaluate(best_cfg)
+            self.best.record_start(best_cfg, best_pnl)
+        # Gains des sondes axiales autour du centre courant (vidé quand le centre bouge)
+        axis_gains = {}
 
         R = 1
         while True:
             Display.title("Spherical Radius R = " + str(R))
             improved = False
 
-            for offset_vec in self.generate_spherical_offsets(params, R):
-
-                cfg = best_cfg.copy()
-                valid = True
-
-                for p, units in zip(params, offset_vec):
-                    newv = p.apply_offset(cfg[p.name], units)
-                    if newv is None:
-                        valid = False
+            # Les offsets sont évalués par lots autour du centre courant, puis
+            # parcourus dans l'ordre : dès qu'une config améliore le record, le
+            # centre bouge et les offsets suivants du lot sont ré-évalués autour
+            # du nouveau centre (même trajectoire qu'une évaluation une à une).
+            # Centre fixe pendant la sphère en first_improvement : filtre des bornes en bloc
+            offsets = self.generate_spherical_offsets(params, R, best_cfg if first_improvement else None)
+            pending = []
+            pruned = 0
+            while True:
+                while len(pending) < self.batch_size:
+                    offset_vec = next(offsets, None)
+                    if offset_vec is None:
                         break
-                    cfg[p.name] = newv
-
-                if not valid:
-                    continue
+                    pending.append(offset_vec)
+                if not pending:
+                    break
+
+                batch = []
+                for i, offset_vec in enumerate(pending):
+                    cfg = self.apply_offsets(best_cfg, params, offset_vec)
+                    if cfg is None:
+                        continue
+                    if self.predicted_no_gain(best_cfg, best_pnl, params, offset_vec, axis_gains):
+                        pruned += 1
+                        continue
+                    batch.append((i, cfg))
+
+                consumed = len(pending)
+                pnls = self.evaluate_batch([cfg for _, cfg in batch])
+                for (i, cfg), pnl in zip(batch, pnls):
+                    if pnl > best_pnl:
+                        best_cfg = cfg
+                        best_pnl = pnl
+                        axis_gains = {}
+                        improved = True
+                        self.best.update(best_cfg, best_pnl)
+                        consumed = i + 1
+                        break
+                pending = pending[consumed:]
+                if improved and first_improvement:
+                    break
 
-                pnl = self.evaluate(cfg)
+            if pruned:
+                Display.info(str(pruned) + " combinaisons écartées (gains axiaux non positifs)")
 
-                if pnl > best_pnl:
-                    best_cfg = cfg.copy()
-                    best_pnl = pnl
-                    improved = True
-                    self.best.update(best_cfg, best_pnl)
+            self.best.flush()
 
             if not improved:
                 Display.warn("Aucune amélioration → extension du rayon")
-
-            R += 1
+                R += 1
+            elif first_improvement:
+                Display.info("Amélioration → retour au rayon R = 1")
+                R = 1
+            else:
+                R += 1
 
 
 # ================================================================
@@ -292,9 +880,14 @@ def main():
     cache_file = "results.csv"
     best_file = "best_config.json"
 
-    simulator = TradingSimulator(parallel=True)
-    opt = ParamOptimizer(simulator, param_file, cache_file, best_file)
-    opt.spherical_search()
+    # Un seul niveau de parallélisme : le pool de l'optimiseur répartit les configs
+    simulator = TradingSimulator(parallel=False)
+    opt = ParamOptimizer(simulator, param_file, cache_file, best_file, parallel=True)
+    try:
+        opt.spherical_search()
+    finally:
+        opt.close()
+        simulator.close()
 
 
 if __name__ == "__main__":
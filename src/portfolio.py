@@ -33,6 +33,8 @@ Elle sert d'interface entre la stratégie (AlgoEchappee) et les données de marc
 
 - cash : float - Solde en cash disponible (commence à 1 000 000€)
 - total_pnl : float - PnL total réalisé (somme de tous les trades fermés)
+- open_by_ticker : dict - Index des trades ouverts {ticker: [trades]} (mêmes dicts que trades),
+  tickers dans l'ordre de leur plus ancien trade ouvert ; vide = aucune position
 
 ==== MÉTHODES PRINCIPALES ====
 - refresh_prices(table) : Met à jour les prix et PnL de toutes les positions ouvertes
@@ -86,14 +88,15 @@ class Portfolio:
         self.trades = []  # Liste de tous les trades (ouverts et fermés)
         self.cash = 1000000.0  # Solde initial en dollars
         self.total_pnl = 0.0
+        self.open_by_ticker = {}  # Trades ouverts par ticker : évite de reparcourir self.trades
 
     def refresh_prices(self, table):
         """Mise à jour des derniers prix et PnL pour tous les trades ouverts"""
-        for trade in self.trades:
-            if trade["status"] == "open":
-                last_price = table.get_last_price(trade["ticker"])
-                if last_price is None:
-                    continue
+        for ticker, trades in self.open_by_ticker.items():
+            last_price = table.get_last_price(ticker)
+            if last_price is None:
+                continue
+            for trade in trades:
                 trade["last_price"] = last_price
                 trade["unrealized_pnl"] = (
                     (last_price - trade["entry_price"]) * trade["quantity"]
@@ -126,51 +129,54 @@ class Portfolio:
             "invested_amount": cost
         }
         self.trades.append(trade)
+        self.open_by_ticker.setdefault(ticker, []).append(trade)
         self.cash -= cost
         return True
 
     def close_position(self, ticker, last_price, timestamp, table):
         """Ferme tous les trades associés à un ticker spécifique"""
         closed_any = False
-        for trade in self.trades:
-            if trade["ticker"] == ticker and trade["status"] == "open":
-                realized_pnl = (last_price - trade["entry_price"]) * trade["quantity"]
-                self.total_pnl += realized_pnl
-                self.cash += last_price * trade["quantity"]
-                
-                market_pnl_max = table.ticker_map[ticker].global_max_pnl if ticker in table.ticker_map else 0.0
-                
-                trade.update({
-                    "exit_price": last_price,
-                    "exit_time": timestamp,
-                    "realized_pnl": realized_pnl,
-                    "market_pnl_max": market_pnl_max,
-                    "status": "closed"
-                })
-                closed_any = True
+        for trade in self.open_by_ticker.pop(ticker, ()):
+            realized_pnl = (last_price - trade["entry_price"]) * trade["quantity"]
+            self.total_pnl += realized_pnl
+            self.cash += last_price * trade["quantity"]
+            
+            market_pnl_max = table.ticker_map[ticker].global_max_pnl if ticker in table.ticker_map else 0.0
+            
+            trade.update({
+                "exit_price": last_price,
+                "exit_time": timestamp,
+                "realized_pnl": realized_pnl,
+                "market_pnl_max": market_pnl_max,
+                "status": "closed"
+            })
+            closed_any = True
         return closed_any
 
     def close_all(self, table, timestamp):
         """Ferme tous les trades ouverts"""
-        for trade in self.trades:
-            if trade["status"] == "open":
-                last_price = table.get_last_price(trade["ticker"])
-                if last_price is None:
-                    print(f"Erreur: Prix indisponible pour fermer {trade['ticker']}")
-                    continue
-                self.close_position(trade["ticker"], last_price, timestamp, table)
+        # Copie : close_position retire les tickers de l'index
+        for ticker, trades in list(self.open_by_ticker.items()):
+            last_price = table.get_last_price(ticker)
+            if last_price is None:
+                for _ in trades:
+                    print(f"Erreur: Prix indisponible pour fermer {ticker}")
+                continue
+            self.close_position(ticker, last_price, timestamp, table)
 
     def is_ticker_in_portfolio(self, ticker):
         """Vérifie si un ticker est présent dans les trades ouverts"""
-        return any(trade["ticker"] == ticker and trade["status"] == "open" for trade in self.trades)
+        return ticker in self.open_by_ticker
 
     def get_open_tickers(self):
         """Retourne une liste de tous les tickers avec des positions ouvertes"""
-        return sorted(list(set(trade["ticker"] for trade in self.trades if trade["status"] == "open")))
+        return sorted(self.open_by_ticker)
 
     def get_open_trade_best_pnl(self, table):
         """Retourne le ticker avec le trade ouvert ayant la meilleure position dans SortedPnlTable."""
-        table.resort()  # Assurer que sorted_tickers est à jour
+        # Assurer que sorted_tickers est à jour (déjà le cas juste après un tri : pas de second tri complet)
+        if table.updates_since_last_sort or not table.sorted_tickers:
+            table.resort()
         open_tickers = set(self.get_open_tickers())  # Ensemble des tickers avec trades ouverts
 
         # Parcourir sorted_tickers pour trouver le premier ticker avec un trade ouvert
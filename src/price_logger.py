@@ -1,7 +1,86 @@
 import os
 import time
+import atexit
 import pickle
+import queue
+import threading
+import zipfile
 import lz4.frame
+import numpy as np
+
+
+def _column(values):
+    """Colonne float64 si toutes les valeurs sont des float, sinon object (valeurs conservées telles quelles)."""
+    if all(type(v) is float for v in values):
+        return np.array(values, dtype=np.float64)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+class PriceColumns:
+    """
+    Ticks d'un fichier décompressés une seule fois et stockés en colonnes numpy
+    (timestamps, codes de tickers, prix) : bien plus compact qu'une liste de tuples.
+    L'itération redonne les tuples (timestamp, ticker, price) avec les types Python d'origine.
+    """
+
+    def __init__(self, timestamps, codes, tickers, prices):
+        self.timestamps = timestamps
+        self.codes = codes
+        self.tickers = tickers
+        self.prices = prices
+
+    @classmethod
+    def from_ticks(cls, ticks):
+        """Construit les colonnes à partir d'une séquence de tuples (timestamp, ticker, price)."""
+        if not ticks:
+            return cls(np.empty(0), np.empty(0, dtype=np.int32), [], np.empty(0))
+        timestamps, tickers, prices = zip(*ticks)
+        index = {}
+        codes = np.fromiter((index.setdefault(t, len(index)) for t in tickers),
+                            dtype=np.int32, count=len(tickers))
+        return cls(_column(timestamps), codes, list(index), _column(prices))
+
+    @classmethod
+    def concat(cls, parts):
+        """Recolle plusieurs PriceColumns en un seul ; les codes sont renumérotés par ordre d'apparition."""
+        if not parts:
+            return cls.from_ticks([])
+        if len(parts) == 1:
+            return parts[0]
+        index = {}
+        codes = []
+        for part in parts:
+            remap = np.array([index.setdefault(t, len(index)) for t in part.tickers], dtype=np.int32)
+            codes.append(remap[part.codes] if len(part.codes) else part.codes)
+        return cls(np.concatenate([p.timestamps for p in parts]), np.concatenate(codes),
+                   list(index), np.concatenate([p.prices for p in parts]))
+
+    def to_block(self):
+        """Bloc sérialisable (dict de colonnes) écrit par PriceLogger.flush."""
+        return {"timestamps": self.timestamps, "codes": self.codes,
+                "tickers": self.tickers, "prices": self.prices}
+
+    @classmethod
+    def from_block(cls, block):
+        return cls(block["timestamps"], block["codes"], block["tickers"], block["prices"])
+
+    def __len__(self):
+        return len(self.codes)
+
+    def sorted_end(self):
+        """Dernier timestamp si les ticks sont triés par temps, sinon None."""
+        if not hasattr(self, '_sorted_end'):
+            ts = self.timestamps
+            is_sorted = ts.dtype == np.float64 and len(ts) > 0 and bool(np.all(ts[1:] >= ts[:-1]))
+            self._sorted_end = float(ts[-1]) if is_sorted else None
+        return self._sorted_end
+
+    def __iter__(self):
+        tickers = np.array(self.tickers, dtype=object)[self.codes].tolist()
+        return zip(self.timestamps.tolist(), tickers, self.prices.tolist())
+
 
 class PriceLogger:
     def __init__(self, filepath, flush_interval=10):
@@ -10,6 +89,9 @@ class PriceLogger:
         self.buffer = []
         self.capacity = 1000
         self.last_flush = time.time()
+        # Écrivain en arrière-plan, démarré au premier flush (les lecteurs n'en ont pas besoin)
+        self._queue = None
+        self._writer = None
 
     def save_tuple(self, data: tuple):
         """Ajoute un tuple utilisateur (ticker, price)."""
@@ -22,24 +104,137 @@ class PriceLogger:
             self.flush()
 
     def flush(self):
-        """Sauvegarde le buffer dans le fichier compressé"""
+        """
+        Sauvegarde le buffer dans le fichier compressé, en colonnes (cf. PriceColumns.to_block) :
+        chaque ticker n'est stocké qu'une fois par bloc et les nombres en tableaux bruts.
+        L'écriture disque est faite par un thread dédié : l'appelant ne fait que poster le buffer.
+        """
         if not self.buffer:
             return
-        with lz4.frame.open(self.filepath, mode='ab') as f:
-            pickle.dump(self.buffer, f, protocol=pickle.HIGHEST_PROTOCOL)
+        if self._writer is None:
+            self._queue = queue.Queue(maxsize=16)
+            self._writer = threading.Thread(target=self._write_loop, daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+        self._queue.put(self.buffer)
         # Commenter l'affichage
         # print(f"[FLUSH] {len(self.buffer)} tuples enregistrés.")
-        self.buffer.clear()
+        self.buffer = []
         self.last_flush = time.time()
 
-    def read_all(self):
-        """Générateur qui renvoie les tuples un par un (timestamp, ticker, price)"""
-        if not os.path.exists(self.filepath):
+    def _write_loop(self):
+        """Thread écrivain : seul propriétaire du fichier, jusqu'à recevoir None."""
+        while True:
+            ticks = self._queue.get()
+            try:
+                if ticks is None:
+                    return
+                block = PriceColumns.from_ticks(ticks).to_block()
+                with lz4.frame.open(self.filepath, mode='ab') as f:
+                    pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                print(f"[PriceLogger] Erreur d'écriture dans {self.filepath} : {e}")
+            finally:
+                self._queue.task_done()
+
+    def close(self):
+        """Vide le buffer, attend que tout soit écrit puis arrête le thread écrivain."""
+        self.flush()
+        if self._writer is None:
             return
+        self._queue.put(None)
+        self._writer.join()
+        self._writer = None
+        atexit.unregister(self.close)
+
+    def _wait_written(self):
+        """Attend que les blocs déjà postés soient sur disque (avant une relecture)."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def _read_blocks(self):
+        """
+        Blocs du fichier dans l'ordre d'écriture : liste de tuples (ancien format)
+        ou dict de colonnes (format actuel). Un même fichier peut mélanger les deux.
+        """
         with lz4.frame.open(self.filepath, mode='rb') as f:
             while True:
                 try:
-                    for tup in pickle.load(f):
-                        yield tup
+                    yield pickle.load(f)
                 except EOFError:
-                    break
\ No newline at end of file
+                    break
+
+    def read_all(self):
+        """Générateur qui renvoie les tuples un par un (timestamp, ticker, price)"""
+        self._wait_written()
+        if not os.path.exists(self.filepath):
+            return
+        for block in self._read_blocks():
+            if isinstance(block, dict):
+                yield from PriceColumns.from_block(block)
+            else:
+                yield from block
+
+    def read_columns(self, cache=False):
+        """
+        Décompresse tout le fichier d'un coup et retourne un PriceColumns (None si absent).
+        cache : les colonnes sont aussi écrites dans un .npz voisin, relu directement
+        (ni LZ4 ni pickle) tant qu'il est au moins aussi récent que le fichier.
+        """
+        self._wait_written()
+        if not os.path.exists(self.filepath):
+            return None
+        if cache:
+            columns = self._load_npz()
+            if columns is None:
+                columns = self._decode_columns()
+                self._save_npz(columns)
+            return columns
+        return self._decode_columns()
+
+    def _npz_path(self):
+        return self.filepath + ".npz"
+
+    def _load_npz(self):
+        path = self._npz_path()
+        try:
+            if os.path.getmtime(path) < os.path.getmtime(self.filepath):
+                return None
+            # allow_pickle : colonnes object et tickers (même confiance que les pickles du .lz4)
+            with np.load(path, allow_pickle=True) as data:
+                return PriceColumns(data["timestamps"], data["codes"],
+                                    data["tickers"].tolist(), data["prices"])
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+
+    def _save_npz(self, columns):
+        path = self._npz_path()
+        # Fichier temporaire propre au processus : sans preload, plusieurs workers peuvent
+        # construire le même .npz en même temps, chacun publie le sien d'un os.replace atomique
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.savez(f, timestamps=columns.timestamps, codes=columns.codes,
+                         tickers=np.array(columns.tickers, dtype=object), prices=columns.prices)
+            os.replace(tmp, path)
+        except OSError:
+            # dossier en lecture seule : pas de cache, rien d'autre ne change
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _decode_columns(self):
+        parts = []
+        legacy = []
+        for block in self._read_blocks():
+            if isinstance(block, dict):
+                if legacy:
+                    parts.append(PriceColumns.from_ticks(legacy))
+                    legacy = []
+                parts.append(PriceColumns.from_block(block))
+            else:
+                legacy.extend(block)
+        if legacy:
+            parts.append(PriceColumns.from_ticks(legacy))
+        return PriceColumns.concat(parts)
\ No newline at end of file
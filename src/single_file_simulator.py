@@ -36,7 +36,7 @@ Elle est stateless (pas d'attributs d'instance) pour faciliter la sérialisation
 
 import os
 from colorama import Fore, Style
-from price_logger import PriceLogger
+from price_logger import PriceLogger, PriceColumns
 from sorted_pnl_table import SortedPnlTable
 from algo_echappee import AlgoEchappee
 
@@ -45,7 +45,7 @@ class SingleFileSimulator:
     """★★★ NIVEAU 3 ★★★ Exécute une simulation sur un seul fichier de données."""
     
     @staticmethod
-    def run_single_file(data_file, params, verbose=True):
+    def run_single_file(data_file, params, verbose=True, ticks=None):
         """
         ★★★ NIVEAU 3 : SIMULATION SUR UN SEUL FICHIER ★★★
         Exécute la stratégie sur UN SEUL fichier .lz4 (une journée de trading)
@@ -58,11 +58,12 @@ class SingleFileSimulator:
         Args:
             data_file: Chemin vers le fichier .lz4 à traiter
             params: Dictionnaire des paramètres de la stratégie
+            ticks: Ticks déjà décompressés (ex: PriceColumns) ; si None, le fichier est lu
             
         Returns:
             Dictionnaire avec métriques du fichier (file_pnl, roi, num_traded, etc.)
         """
-        if not os.path.exists(data_file):
+        if ticks is None and not os.path.exists(data_file):
             print(f"{Fore.RED}Erreur: Fichier {data_file} n'existe pas")
             return {
                 'file_pnl': 0.0,
@@ -71,9 +72,145 @@ class SingleFileSimulator:
                 'roi': 0.0
             }
 
-        logger = PriceLogger(data_file, flush_interval=10)
+        if ticks is None:
+            # Fichier décompressé d'un bloc en colonnes (et non tick par tick) :
+            # permet aussi l'arrêt anticipé ci-dessous
+            ticks = PriceLogger(data_file).read_columns()
         table = SortedPnlTable()
-        algo = AlgoEchappee(
+        algo = SingleFileSimulator._make_algo(params, verbose)
+        timestamp = 0.0
+        # Ticks en erreur : un seul accès à error_ticks.log par fichier
+        errors = []
+
+        # Ticks triés d'une seule journée : arrêt anticipé possible (cf. is_idle_until)
+        end_timestamp = ticks.sorted_end() if isinstance(ticks, PriceColumns) else None
+
+        # Méthodes appelées à chaque tick, résolues une seule fois
+        update_ticker = table.update_ticker
+        resort = table.resort
+        portfolio = algo.portfolio
+        refresh_prices = portfolio.refresh_prices
+        algo_main = algo.main
+
+        for timestamp, ticker, price in ticks:
+            try:
+                resort_due = update_ticker(ticker, price, timestamp)
+            except Exception as e:
+                # Erreur notée, écrite dans error_ticks.log en fin de fichier
+                errors.append((e, timestamp, ticker, price))
+                continue
+            
+            # Sans trade ouvert, refresh_prices ne ferait rien
+            if portfolio.open_by_ticker:
+                refresh_prices(table)
+            if resort_due:
+                resort()
+                algo_main(table, timestamp)
+                # Plus de position ni de trade possible aujourd'hui : le reste du fichier ne change rien
+                if end_timestamp is not None and algo.is_idle_until(timestamp, end_timestamp):
+                    break
+        SingleFileSimulator._log_tick_errors(data_file, errors)
+        algo.portfolio.close_all(table, timestamp)
+        return SingleFileSimulator._file_result(algo, data_file, verbose)
+
+
+    @staticmethod
+    def run_single_file_batch(data_file, configs, verbose=False, ticks=None):
+        """
+        Comme run_single_file pour plusieurs configs, en un seul passage sur les ticks.
+        La SortedPnlTable ne dépend pas de la config : elle est mise à jour une fois
+        par tick et partagée par toutes les stratégies, qui avancent ensemble.
+        Une config en erreur reçoit le résultat vide de MultiFileSimulator, sans
+        interrompre les autres.
+        
+        Returns:
+            Liste de dictionnaires de métriques, dans l'ordre de `configs`
+        """
+        if ticks is None and not os.path.exists(data_file):
+            print(f"{Fore.RED}Erreur: Fichier {data_file} n'existe pas")
+            return [SingleFileSimulator._empty_result() for _ in configs]
+
+        if ticks is None:
+            ticks = PriceLogger(data_file).read_columns()
+        table = SortedPnlTable()
+        algos = []
+        failed = set()
+        for i, params in enumerate(configs):
+            try:
+                algos.append(SingleFileSimulator._make_algo(params, verbose))
+            except Exception:
+                algos.append(None)
+                failed.add(i)
+        timestamp = 0.0
+        errors = []
+
+        end_timestamp = ticks.sorted_end() if isinstance(ticks, PriceColumns) else None
+
+        update_ticker = table.update_ticker
+        resort = table.resort
+        # Stratégies encore actives (ni en erreur, ni arrêtées par is_idle_until)
+        active = [i for i in range(len(algos)) if i not in failed]
+        portfolios = [algos[i].portfolio for i in active]
+
+        for timestamp, ticker, price in ticks:
+            try:
+                resort_due = update_ticker(ticker, price, timestamp)
+            except Exception as e:
+                errors.append((e, timestamp, ticker, price))
+                continue
+
+            for portfolio in portfolios:
+                if portfolio.open_by_ticker:
+                    portfolio.refresh_prices(table)
+            if resort_due:
+                resort()
+                still_active = []
+                for i in active:
+                    try:
+                        algos[i].main(table, timestamp)
+                    except Exception:
+                        failed.add(i)
+                        continue
+                    if end_timestamp is None or not algos[i].is_idle_until(timestamp, end_timestamp):
+                        still_active.append(i)
+                if len(still_active) != len(active):
+                    active = still_active
+                    portfolios = [algos[i].portfolio for i in active]
+                    if not active:
+                        break
+
+        SingleFileSimulator._log_tick_errors(data_file, errors)
+        results = []
+        for i, algo in enumerate(algos):
+            if i in failed:
+                results.append(SingleFileSimulator._empty_result())
+                continue
+            try:
+                algo.portfolio.close_all(table, timestamp)
+                results.append(SingleFileSimulator._file_result(algo, data_file, verbose))
+            except Exception:
+                results.append(SingleFileSimulator._empty_result())
+        return results
+
+    @staticmethod
+    def _log_tick_errors(data_file, errors):
+        """Ajoute d'un coup à error_ticks.log les ticks en erreur d'un fichier."""
+        if not errors:
+            return
+        with open('error_ticks.log', 'a', encoding='utf-8') as f:
+            for e, timestamp, ticker, price in errors:
+                f.write(f"ERROR: {e.__class__.__name__}: {e}\n")
+                f.write(f"  File: {data_file}\n")
+                f.write(f"  Timestamp: {timestamp}, Ticker: {ticker}, Price: {price} (type: {type(price).__name__})\n\n")
+
+    @staticmethod
+    def _empty_result():
+        # Résultat d'une simulation en erreur (cf. MultiFileSimulator._simulate_single_file)
+        return {"file_pnl": 0.0, "num_traded": 0}
+
+    @staticmethod
+    def _make_algo(params, verbose):
+        return AlgoEchappee(
             take_profit_market_pnl=params['take_profit_market_pnl'],
             min_escape_time=params['min_escape_time'],
             trail_stop_market_pnl=params['trail_stop_market_pnl'],
@@ -90,29 +227,22 @@ class SingleFileSimulator:
             max_trade_duration_minutes=params.get('max_trade_duration_minutes', 60),
             verbose=verbose
         )
-        timestamp = 0.0
 
-        for timestamp, ticker, price in logger.read_all():
-            try:
-                table.update_ticker(ticker, price, timestamp)
-            except Exception as e:
-                # Logger l'erreur dans un fichier
-                with open('error_ticks.log', 'a', encoding='utf-8') as f:
-                    f.write(f"ERROR: {e.__class__.__name__}: {e}\n")
-                    f.write(f"  File: {data_file}\n")
-                    f.write(f"  Timestamp: {timestamp}, Ticker: {ticker}, Price: {price} (type: {type(price).__name__})\n\n")
-                continue
-            
-            algo.portfolio.refresh_prices(table)
-            if table.has_been_resorted():
-                algo.main(table, timestamp)
-        algo.portfolio.close_all(table, timestamp)
-        
+    @staticmethod
+    def _file_result(algo, data_file, verbose):
+        """Métriques du fichier une fois toutes les positions fermées."""
         file_pnl = algo.portfolio.total_pnl
-        traded_tickers = set(trade['ticker'] for trade in algo.portfolio.trades if trade['status'] == 'closed')
+        # Un seul passage sur les trades fermés : tickers tradés et capital investi
+        traded_tickers = set()
+        file_invested_capital = 0.0
+        for trade in algo.portfolio.trades:
+            if trade['status'] == 'closed':
+                traded_tickers.add(trade['ticker'])
+                file_invested_capital += trade['invested_amount']
         num_traded = len(traded_tickers)
-        file_invested_capital = sum(trade['invested_amount'] for trade in algo.portfolio.trades if trade['status'] == 'closed')
-        roi = (file_pnl / file_invested_capital * 100) if file_invested_capital != 0 else float('inf')
+        # ROI indéfini sans capital investi : NaN plutôt que inf (le ROI par fichier
+        # n'est pas repris par MultiFileSimulator._aggregate, qui recalcule le sien)
+        roi = (file_pnl / file_invested_capital * 100) if file_invested_capital != 0 else float('nan')
 
         if verbose:
             file_pnl_color = Fore.GREEN if file_pnl >= 0 else Fore.RED
@@ -165,7 +295,7 @@ def main():
     
     print(f"\n{Fore.GREEN}{Style.BRIGHT}=== Résumé ==={Style.RESET_ALL}")
     print(f"{Fore.CYAN}PnL: {Fore.GREEN if result['file_pnl'] >= 0 else Fore.RED}${result['file_pnl']:.2f}{Style.RESET_ALL}")
-    print(f"{Fore.CYAN}ROI: {result['roi']:.2f}%")
+    print(f"{Fore.CYAN}ROI: {result['roi']:.2f}%" if result['file_invested_capital'] != 0 else f"{Fore.CYAN}ROI: N/A")
     print(f"{Fore.CYAN}Tickers tradés: {result['num_traded']}")
     print(f"{Fore.CYAN}Capital investi: ${result['file_invested_capital']:.2f}")
 
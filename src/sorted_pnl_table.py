@@ -1,10 +1,14 @@
 class SortedPnlTable:
+    # Nombre de mises à jour entre deux tris
+    RESORT_THRESHOLD = 1000
+
     def __init__(self):
         self.ticker_map = {}
         self.sorted_tickers = []
         self.updates_since_last_sort = 0
 
     def update_ticker(self, ticker, price, timestamp):
+        """Met à jour le ticker ; retourne True quand un tri est dû (cf. RESORT_THRESHOLD)."""
         if ticker not in self.ticker_map:
             entry = self.TickerEntry(price, timestamp)
             self.ticker_map[ticker] = entry
@@ -12,6 +16,7 @@ class SortedPnlTable:
             entry = self.ticker_map[ticker]
             entry.update(price, timestamp)
         self.updates_since_last_sort += 1
+        return self.updates_since_last_sort >= self.RESORT_THRESHOLD
 
     def resort(self):
         self.sorted_tickers = sorted(
@@ -21,7 +26,7 @@ class SortedPnlTable:
         )
         self.updates_since_last_sort = 0
 
-    def has_been_resorted(self, threshold=1000):
+    def has_been_resorted(self, threshold=RESORT_THRESHOLD):
         if self.updates_since_last_sort >= threshold:
             self.resort()
             return True
@@ -36,6 +41,15 @@ class SortedPnlTable:
         return None
 
     class TickerEntry:
+        # Attributs fixes : accès plus rapides dans update(), appelée à chaque tick
+        __slots__ = (
+            'first_price', 'last_price', 'first_time', 'last_time',
+            'current_pnl', 'highest_pnl_so_far', 'highest_pnl_time', 'highest_pnl_price',
+            'max_drawdown', 'peak_pnl', 'peak_price', 'peak_time',
+            'trough_pnl', 'trough_price', 'trough_time',
+            'global_max_pnl', 'global_max_price', 'global_max_time',
+        )
+
         def __init__(self, first_price, first_time):
             self.first_price = first_price
             self.last_price = first_price
@@ -61,28 +75,32 @@ class SortedPnlTable:
             self.global_max_time = first_time
 
         def update(self, price, timestamp):
+            # Calculs sur variables locales (un seul accès par attribut)
             self.last_price = price
             self.last_time = timestamp
-            self.current_pnl = (self.last_price - self.first_price) / self.first_price * 100
+            first_price = self.first_price
+            current_pnl = (price - first_price) / first_price * 100
+            self.current_pnl = current_pnl
 
-            if self.current_pnl > self.global_max_pnl:
-                self.global_max_pnl = self.current_pnl
-                self.global_max_price = self.last_price
+            if current_pnl > self.global_max_pnl:
+                self.global_max_pnl = current_pnl
+                self.global_max_price = price
                 self.global_max_time = timestamp
 
-            if self.current_pnl > self.highest_pnl_so_far:
-                self.highest_pnl_so_far = self.current_pnl
-                self.highest_pnl_price = self.last_price
+            highest = self.highest_pnl_so_far
+            if current_pnl > highest:
+                highest = self.highest_pnl_so_far = current_pnl
+                self.highest_pnl_price = price
                 self.highest_pnl_time = timestamp
 
-            drawdown = self.current_pnl - self.highest_pnl_so_far
+            drawdown = current_pnl - highest
             if drawdown < self.max_drawdown:
                 self.max_drawdown = drawdown
-                self.peak_pnl = self.highest_pnl_so_far
+                self.peak_pnl = highest
                 self.peak_price = self.highest_pnl_price
                 self.peak_time = self.highest_pnl_time
-                self.trough_pnl = self.current_pnl
-                self.trough_price = self.last_price
+                self.trough_pnl = current_pnl
+                self.trough_price = price
                 self.trough_time = timestamp
 
         def get_pnl(self):
@@ -0,0 +1,46 @@
+import csv
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from param_optimizer import ParamOptimizer
+
+
+def _optimizer(tmp_path):
+    return ParamOptimizer(json_file=str(tmp_path / "params.json"),
+                          results_file=str(tmp_path / "results.csv"),
+                          best_file=str(tmp_path / "best_results.csv"),
+                          best_config_file=str(tmp_path / "best_config.json"),
+                          data_files=[str(tmp_path / "absent.lz4")], parallel=False)
+
+
+def test_append_keeps_existing_header(tmp_path):
+    # results.csv au format de param_optimizer_chat4 : métriques avant les paramètres
+    header = ["pnl", "nb_trades", "roi", "win_rate", "drawdown", "drawdown_pct", "a", "b"]
+    existing = ["12.5", "3", "4.1", "50.0", "1.0", "2.0", "1", "x"]
+    results = tmp_path / "results.csv"
+    with open(results, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerow(existing)
+
+    optimizer = _optimizer(tmp_path)
+    optimizer._record_result(7.0, {"b": "y", "a": 2})
+    optimizer.close()
+
+    with open(results, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == header
+    assert rows[1] == existing
+    assert rows[2] == ["7.0", "", "", "", "", "", "2", "y"]
+
+
+def test_new_file_gets_row_header(tmp_path):
+    optimizer = _optimizer(tmp_path)
+    optimizer._record_result(1.0, {"a": 1})
+    optimizer.close()
+
+    with open(tmp_path / "results.csv", newline="") as f:
+        assert list(csv.reader(f)) == [["pnl", "a"], ["1.0", "1"]]
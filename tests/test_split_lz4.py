@@ -0,0 +1,50 @@
+import os
+import pickle
+import sys
+
+import lz4.frame
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+from price_logger import PriceLogger
+from split_lz4 import fmt_date, split_prices_by_day
+
+
+def _write_columns(path, ticks):
+    # Bloc au format actuel (dict de colonnes), écrit par le thread de PriceLogger
+    logger = PriceLogger(path)
+    logger.buffer = list(ticks)
+    logger.close()
+
+
+def _write_legacy(path, ticks):
+    # Bloc à l'ancien format : liste de tuples picklée
+    with lz4.frame.open(path, mode='ab') as f:
+        pickle.dump(list(ticks), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def test_split_round_trip_both_formats(tmp_path):
+    t0 = 1_700_000_000.0
+    day1 = [(t0, "AAA", 10.0), (t0 + 60, "BBB", 20.5), (t0 + 120, "AAA", None)]
+    day2 = [(t0 + 86400, "AAA", 11.0), (t0 + 86460, "CCC", "bad")]
+    legacy = [(t0 + 86520, "BBB", 21.0)]
+
+    source = str(tmp_path / "prices_data.lz4")
+    _write_columns(source, day1 + day2)
+    _write_legacy(source, legacy)
+
+    out_dir = tmp_path / "out"
+    split_prices_by_day(source, str(out_dir))
+
+    expected = {}
+    for tick in day1 + day2 + legacy:
+        expected.setdefault(fmt_date(tick[0]), []).append(tick)
+
+    written = {}
+    for name in os.listdir(out_dir):
+        day = name[:-len("-prices_data.lz4")]
+        written[day] = list(PriceLogger(str(out_dir / name)).read_all())
+
+    assert written == expected
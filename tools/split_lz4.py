@@ -4,6 +4,7 @@ import pickle
 import lz4.frame
 import glob
 from datetime import datetime, timedelta
+from price_logger import PriceLogger
 
 def fmt_date(timestamp):
     """Converti un timestamp en date (YYYY-MM-DD)."""
@@ -49,17 +50,12 @@ def split_prices_by_day(input_filepath, output_dir):
 
     print(f"Traitement: {input_filepath}")
     try:
-        with lz4.frame.open(input_filepath, mode='rb') as f:
-            while True:
-                try:
-                    buffer = pickle.load(f)
-                    for timestamp, ticker, price in buffer:
-                        day = fmt_date(timestamp)
-                        if day not in data_by_day:
-                            data_by_day[day] = []
-                        data_by_day[day].append((timestamp, ticker, price))
-                except EOFError:
-                    break
+        # Lecture via PriceLogger : blocs en colonnes (format actuel) comme listes de tuples (ancien format)
+        for timestamp, ticker, price in PriceLogger(input_filepath).read_all():
+            day = fmt_date(timestamp)
+            if day not in data_by_day:
+                data_by_day[day] = []
+            data_by_day[day].append((timestamp, ticker, price))
     except Exception as e:
         print(f"Erreur lors de la lecture de {input_filepath}: {e}")
         return